@@ -1,13 +1,19 @@
-import json
 import os
 
 import matplotlib
 from libdc3.methods.acc_lumi_analyzer import AccLuminosityAnalyzer
 from libdc3.methods.bril_actions import BrilActions
-from libdc3.methods.json_producer import JsonProducer
 from libdc3.methods.lumiloss_analyzer import LumilossAnalyzer
 from libdc3.methods.lumiloss_plotter import LumilossPlotter
 from libdc3.methods.rr_actions import RunRegistryActions
+from utils.lumicache.bril import BrilLumisCache
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumiplots.lazy import save_lumiloss_manifest
+from utils.lumisections.columnar import LumisectionTable
+from utils.lumisections.json_producer import MultiJsonProducer, json_profiles
+from utils.lumisections.run_selection import RunSelection
+from utils.parallel.plots import PlotStage
+from utils.results.writer import STORE_PLAIN, write_cms_json, write_json, write_text
 
 
 matplotlib.use("Agg")
@@ -34,36 +40,37 @@ def certify_call(call_meta: dict, run_job: dict, job: dict):
     del run_job["result"]
 
     # Filter discover runs result based on ignore_runs parameter
-    included_runs = [run for run in included_runs if run not in job["params"]["runs_to_ignore"]]
-    low_lumi_runs = [run for run in low_lumi_runs if run not in job["params"]["runs_to_ignore"]]
-    not_in_dcs_runs = [run for run in not_in_dcs_runs if run not in job["params"]["runs_to_ignore"]]
+    runs_to_ignore = RunSelection(job["params"]["runs_to_ignore"])
+    included_runs = runs_to_ignore.exclude_runs(included_runs)
+    low_lumi_runs = runs_to_ignore.exclude_runs(low_lumi_runs)
+    not_in_dcs_runs = runs_to_ignore.exclude_runs(not_in_dcs_runs)
 
     # Prepare run list
     run_list = sorted([*included_runs, *low_lumi_runs, *not_in_dcs_runs, *job["params"]["runs_to_ignore"]])
 
     # Fetch RR and OMS lumisection flags/bits
     rra = RunRegistryActions(class_name=call_meta["class_name"], dataset_name=call_meta["dataset_name"])
-    offline_lumis = rra.multi_fetch_rr_oms_joint_lumis(run_list=run_list)
-    del rra
+    rrc = RunRegistryLumisCache(rra, cache_dir=job.get("cache_dir"))
+    offline_lumis = LumisectionTable.from_records(rrc.multi_fetch_rr_oms_joint_lumis(run_list=run_list))
+    del rra, rrc
 
     # Generate pre, golden and muon JSONs
-    elegible_runs = [*included_runs, *not_in_dcs_runs]
-    filtered_lumis = [lumi for lumi in offline_lumis if lumi["run_number"] in elegible_runs]
-    producer = JsonProducer(rr_oms_lumis=filtered_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
-    pre_json = producer.generate(job["params"]["pre_json_oms_flags"])
-    golden_json = producer.generate(job["params"]["golden_json_oms_flags"], job["params"]["golden_json_rr_flags"])
-    muon_json = producer.generate(job["params"]["muon_json_oms_flags"], job["params"]["muon_json_rr_flags"])
+    elegible_runs = RunSelection(included_runs, not_in_dcs_runs)
+    filtered_lumis = offline_lumis.filter_runs(elegible_runs)
+    producer = MultiJsonProducer(
+        rr_oms_lumis=filtered_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"]
+    )
+    jsons = producer.generate(json_profiles(job["params"]))
     del included_runs, not_in_dcs_runs, elegible_runs, filtered_lumis, producer
 
     # Save JSONs
+    results_storage = job.get("results_storage", STORE_PLAIN)
     base_path = os.path.join(job["results_dir"], "jsons")
     os.makedirs(base_path, exist_ok=True)
-    with open(os.path.join(base_path, "pre.json"), "w") as f:
-        json.dump(pre_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "golden.json"), "w") as f:
-        json.dump(golden_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "muon.json"), "w") as f:
-        json.dump(muon_json, f, ensure_ascii=False, indent=4)
+    for name, compact_json in jsons.items():
+        write_cms_json(os.path.join(base_path, f"{name}.json"), compact_json, storage=results_storage)
+    pre_json, golden_json, muon_json = jsons["pre"], jsons["golden"], jsons["muon"]
+    del jsons
 
     # Fetch Bril lumisections
     min_run = min(run_list)
@@ -76,20 +83,20 @@ def certify_call(call_meta: dict, run_job: dict, job: dict):
         amodetag=run_job["bril_amodetag"],
         normtag=run_job["bril_normtag"],
     )
-    bril_lumis = ba.fetch_lumis(begin=min_run, end=max_run).get("detailed")
-    bril_lumis = [lumi for lumi in bril_lumis if lumi["run_number"] in run_list]
+    bc = BrilLumisCache(ba, cache_dir=job.get("cache_dir"))
     used_keys = ["run_number", "ls_number", "delivered", "recorded", "datetime"]
-    bril_lumis = [{key: value for key, value in item.items() if key in used_keys} for item in bril_lumis]
-    del min_run, max_run, ba
+    bril_lumis = LumisectionTable.from_records(bc.fetch_lumis(begin=min_run, end=max_run).get("detailed"), used_keys)
+    bril_lumis = bril_lumis.filter_runs(run_list).to_records()
+    del min_run, max_run, ba, bc
 
     # Analyze lumiloss
     lumiloss = LumilossAnalyzer(
-        rr_oms_lumis=offline_lumis,
+        rr_oms_lumis=offline_lumis.to_records(),
         bril_lumis=bril_lumis,
         pre_json=pre_json,
         dc_json=golden_json,
-        low_lumi_runs=low_lumi_runs,
-        ignore_runs=job["params"]["runs_to_ignore"],
+        low_lumi_runs=RunSelection(low_lumi_runs),
+        ignore_runs=runs_to_ignore,
         bril_unit=run_job["bril_unit"],
         target_unit=job["params"]["target_lumiloss_unit"],
     )
@@ -106,30 +113,39 @@ def certify_call(call_meta: dict, run_job: dict, job: dict):
     lumiloss_data_path = os.path.join(job["results_dir"], "lumiloss/data")
     os.makedirs(lumiloss_data_path, exist_ok=True)
     for key, value in lumiloss_results.items():
-        with open(os.path.join(lumiloss_data_path, f"{key}.json"), "w") as f:
-            json.dump(value, f)
+        write_json(os.path.join(lumiloss_data_path, f"{key}.json"), value, storage=results_storage)
 
-    with open(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), "w") as f:
-        f.write(txt_inclusive)
-    with open(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), "w") as f:
-        f.write(txt_exclusive)
+    write_text(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), txt_inclusive, storage=results_storage)
+    write_text(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), txt_exclusive, storage=results_storage)
     del txt_inclusive, txt_exclusive
 
+    plot_stage = PlotStage(workers=job.get("workers"))
+
     # Plot lumiloss charts
     lumiloss_plots_path = os.path.join(job["results_dir"], "lumiloss/plots")
     os.makedirs(lumiloss_plots_path, exist_ok=True)
-    plots = LumilossPlotter(
-        lumiloss=lumiloss_results, unit=job["params"]["target_lumiloss_unit"], output_path=lumiloss_plots_path
-    )
-    plots.plot_subsystem_dqmflag_loss()
-    plots.plot_dcs_loss()
-    plots.plot_cms_inclusive_loss()
-    plots.plot_cms_exclusive_loss()
-    plots.plot_cms_detailed_fraction_exclusive_loss()
-    plots.plot_inclusive_loss_by_subdetector()
-    plots.plot_exclusive_loss_by_subdetector()
-    plots.plot_fraction_of_exclusive_loss_by_subdetector()
-    del lumiloss_results, plots
+    if job.get("lazy_plots"):
+        # Only register the plots, the files API renders them when first requested
+        save_lumiloss_manifest(
+            lumiloss_plots_path, lumiloss_data_path, job["params"]["target_lumiloss_unit"], lumiloss_results
+        )
+    else:
+        plots = LumilossPlotter(
+            lumiloss=lumiloss_results, unit=job["params"]["target_lumiloss_unit"], output_path=lumiloss_plots_path
+        )
+        plot_stage.add(
+            plots,
+            "plot_subsystem_dqmflag_loss",
+            "plot_dcs_loss",
+            "plot_cms_inclusive_loss",
+            "plot_cms_exclusive_loss",
+            "plot_cms_detailed_fraction_exclusive_loss",
+            "plot_inclusive_loss_by_subdetector",
+            "plot_exclusive_loss_by_subdetector",
+            "plot_fraction_of_exclusive_loss_by_subdetector",
+        )
+        del plots
+    del lumiloss_results
 
     # Plot Acc. Luminosity for the goldenJSON
     acc_lumi_plots_path = os.path.join(job["results_dir"], "acc_lumi/golden")
@@ -145,8 +161,7 @@ def certify_call(call_meta: dict, run_job: dict, job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del golden_json, acc_lumi
 
     # Plot Acc. Luminosity for the muonJSON
@@ -163,6 +178,8 @@ def certify_call(call_meta: dict, run_job: dict, job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del muon_json, acc_lumi
+
+    # Render all plots
+    plot_stage.render()
@@ -2,6 +2,8 @@ import json
 import traceback
 
 from celery import shared_task
+from django.conf import settings
+from utils.file_serving.listing import invalidate_listings
 
 from ...models import Call, CallJob, CallJobStatus
 from ...serializers import CallJobSerializer, CallSerializer
@@ -15,6 +17,10 @@ def certify_call_task(job_id):
         job.status = CallJobStatus.STARTED
         job.save()
         job_input = CallJobSerializer(job).data
+        job_input["cache_dir"] = settings.LUMI_CACHE_DIR
+        job_input["results_storage"] = settings.RESULTS_STORAGE
+        job_input["workers"] = settings.LOCAL_JOB_WORKERS
+        job_input["lazy_plots"] = settings.LAZY_PLOTS
         call_meta = Call.objects.get(pk=job_input["call_id"])
         call_meta = CallSerializer(call_meta).data
         run_job = CallJob.objects.get(pk=job_input["params"]["run_job_id"])
@@ -26,7 +32,9 @@ def certify_call_task(job_id):
         job.status = CallJobStatus.FAILURE
         job.traceback = traceback.format_exc()
         job.save()
+        invalidate_listings(job.results_dir)
         raise err
     else:
         job.status = CallJobStatus.SUCCESS
         job.save()
+        invalidate_listings(job.results_dir)
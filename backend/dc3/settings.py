@@ -1,4 +1,5 @@
 import os.path
+import tempfile
 from pathlib import Path
 
 import dj_database_url
@@ -191,12 +192,55 @@ CELERY_BROKER_URL = config("DJANGO_CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = config("DJANGO_CELERY_RESULT_BACKEND")
 CELERY_TASK_TRACK_STARTED = True
 CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 900}
+HTCONDOR_TRACKER_INTERVAL = config("DJANGO_HTCONDOR_TRACKER_INTERVAL", cast=int, default=60)
+CELERY_BEAT_SCHEDULE = {
+    "track-htcondor-jobs": {
+        "task": "jobs.tasks.track_htcondor_jobs.task.track_htcondor_jobs_task",
+        "schedule": HTCONDOR_TRACKER_INTERVAL,
+        # A tick still queued when the next one is due is dropped
+        "options": {"expires": HTCONDOR_TRACKER_INTERVAL},
+    },
+}
+# Jobs submitted longer ago that HTCondor doesn't know about anymore are failed by the tracker
+HTCONDOR_TRACKER_MISSING_TIMEOUT = config("DJANGO_HTCONDOR_TRACKER_MISSING_TIMEOUT", cast=int, default=3600)
+# Non empty sends the HTCondor tasks (submission, tracking, results sync) to this queue, so a dedicated worker
+# serves them while local jobs run. That worker must not recycle its processes (--max-tasks-per-child) for the
+# pooled SSH connections to be reused between tasks
+CONDOR_TASKS_QUEUE = config("DJANGO_CONDOR_TASKS_QUEUE", default="")
+CELERY_TASK_ROUTES = (
+    {
+        "jobs.tasks.*.task.*_htcondor_task": {"queue": CONDOR_TASKS_QUEUE},
+        "jobs.tasks.track_htcondor_jobs.task.*": {"queue": CONDOR_TASKS_QUEUE},
+    }
+    if CONDOR_TASKS_QUEUE
+    else {}
+)
 
 # Task
 UNAUTHENTICATED_USER = "unknown-user"
 BASE_LOCAL_RESULTS_DIR = config("DJANGO_BASE_LOCAL_RESULTS_DIR")
+# Non empty lets the reverse proxy send result files, via X-Accel-Redirect to <prefix><absolute path>
+FILES_ACCEL_REDIRECT_PREFIX = config("DJANGO_FILES_ACCEL_REDIRECT_PREFIX", default="")
 BASE_CONDOR_WORK_DIR = config("DJANGO_BASE_CONDOR_WORK_DIR")
 BASE_CONDOR_RESULTS_DIR = config("DJANGO_BASE_CONDOR_RESULTS_DIR")
+BASE_CONDOR_CACHE_DIR = config("DJANGO_BASE_CONDOR_CACHE_DIR", default="")  # Empty disables caching in HTCondor
+BASE_CONDOR_ENV_DIR = config("DJANGO_BASE_CONDOR_ENV_DIR", default="")  # Empty disables prebuilt environments
+# Development only: non empty replaces lxplus with the local fake HTCondor rooted at this directory
+HTCONDOR_FAKE_DIR = config("DJANGO_HTCONDOR_FAKE_DIR", default="")
+CONDOR_JOB_WORKERS = config("DJANGO_CONDOR_JOB_WORKERS", cast=int, default=4)
+# Run full certification as an HTCondor DAG, one job per era
+CONDOR_FULL_CERTIFICATION_DAG = bool(config("DJANGO_CONDOR_FULL_CERTIFICATION_DAG", cast=int, default=0))
+CONDOR_SYNC_STREAMS = config("DJANGO_CONDOR_SYNC_STREAMS", cast=int, default=4)  # Parallel SFTP downloads of results
+LOCAL_JOB_WORKERS = config("DJANGO_LOCAL_JOB_WORKERS", cast=int, default=1)
+LOCAL_JOB_CONCURRENCY = config("DJANGO_LOCAL_JOB_CONCURRENCY", cast=int, default=1)  # Celery worker concurrency
+# Jobs with more lumisections always go to HTCondor
+ROUTING_LOCAL_MAX_LUMIS = config("DJANGO_ROUTING_LOCAL_MAX_LUMIS", cast=int, default=150000)
+LAZY_PLOTS = bool(config("DJANGO_LAZY_PLOTS", cast=int, default=0))  # Render lumiloss plots on first request
+# Text results storage: "plain", "plain+gzip" (plus a .gz sibling) or "gzip" (only the .gz, decompressed when served)
+RESULTS_STORAGE = config("DJANGO_RESULTS_STORAGE", default="plain")
+# RR/OMS and BRIL lumisections cache, read by the API (routing estimates) and the workers. Must be outside of
+# BASE_LOCAL_RESULTS_DIR, which is served to users
+LUMI_CACHE_DIR = config("DJANGO_LUMI_CACHE_DIR", default=os.path.join(tempfile.gettempdir(), "dc3-lumi-cache"))
 KEYTAB_USR = config("DJANGO_KEYTAB_USR")
 KEYTAB_PWD = config("DJANGO_KEYTAB_PWD")
 CERT_FPATH = config("DJANGO_CERT_FPATH")
@@ -1,16 +1,31 @@
+import json
 import os
-from datetime import datetime
+import uuid
 from typing import ClassVar
 
 from django.conf import settings
-from django.http import FileResponse, HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from jobs.models import Job, JobStatus
 from rest_framework import status, viewsets
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from utils.file_serving.archives import iter_tar_gz, iter_zip, list_archive_entries
+from utils.file_serving.listing import listing_cache
+from utils.file_serving.responses import content_etag, not_modified_response, serve_file, set_cache_headers
+from utils.lumiplots.lazy import list_lazy_entries, render_lazy_plot
 from utils.rest_framework_cern_sso.authentication import (
     CERNKeycloakConfidentialAuthentication,
 )
+from utils.results.reader import result_exists
+
+
+# Archive format -> (generator, content type, extension)
+ARCHIVE_FORMATS = {
+    "zip": (iter_zip, "application/zip", ".zip"),
+    "tar.gz": (iter_tar_gz, "application/gzip", ".tar.gz"),
+}
 
 
 class FileViewSet(viewsets.ViewSet):
@@ -22,27 +37,44 @@ class FileViewSet(viewsets.ViewSet):
         absolute_path = os.path.abspath(path)
         return absolute_path.startswith(os.path.abspath(base_dir))
 
+    def is_final_result_path(self, path):
+        """
+        Whether `path` is inside the results directory of a job that succeeded, which is never written again
+
+        HTCondor jobs only succeed once their results are synced (SYNCING before), while failed jobs
+        may have left partial results that a retry rewrites.
+        """
+        jobs_dir = os.path.join(os.path.abspath(settings.BASE_LOCAL_RESULTS_DIR), "jobs")
+        relative_path = os.path.relpath(os.path.abspath(path), jobs_dir)
+        job_id = relative_path.split(os.sep)[0]
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return False
+        return Job.objects.filter(pk=job_id, status=JobStatus.SUCCESS).exists()
+
+    def exists_or_render(self, file_path):
+        if os.path.exists(file_path) or result_exists(file_path):
+            return True
+        return render_lazy_plot(file_path, settings.BASE_LOCAL_RESULTS_DIR)
+
     def list(self, request):
         dir_path = request.query_params.get("dir", "")
         if not self.is_safe_path(settings.BASE_LOCAL_RESULTS_DIR, dir_path):
             return Response({"error": "Invalid directory path"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not os.path.exists(dir_path):
+        if not os.path.exists(dir_path) and not list_lazy_entries(dir_path, settings.BASE_LOCAL_RESULTS_DIR):
             return Response({"error": "Directory does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
-        files = []
-        for entry in os.listdir(dir_path):
-            entry_path = os.path.join(dir_path, entry)
-            files.append(
-                {
-                    "name": entry,
-                    "is_directory": os.path.isdir(entry_path),
-                    "size": os.path.getsize(entry_path) if os.path.isfile(entry_path) else None,
-                    "last_modified": datetime.fromtimestamp(os.path.getmtime(entry_path)).isoformat(),
-                }
-            )
+        # The whole tree under `dir` (e.g. a job results directory) in one response, nested in `children`
+        recursive = request.query_params.get("recursive", "").lower() in ("1", "true")
+        files = listing_cache.get(dir_path, settings.BASE_LOCAL_RESULTS_DIR, recursive)
 
-        return Response(files)
+        # Listings change while a job runs or plots are rendered, they are always revalidated
+        etag = content_etag(json.dumps(files, sort_keys=True).encode())
+        response = not_modified_response(request, etag, None) or Response(files)
+        set_cache_headers(response, etag, None)
+        return response
 
     @action(detail=False, methods=["GET"], url_path="content")
     def file_content(self, request):
@@ -50,9 +82,9 @@ class FileViewSet(viewsets.ViewSet):
         if not self.is_safe_path(settings.BASE_LOCAL_RESULTS_DIR, file_path):
             return Response({"error": "Invalid directory path"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not os.path.exists(file_path):
+        if not self.exists_or_render(file_path):
             return Response({"error": "File does not exist"}, status=status.HTTP_404_NOT_FOUND)
-        if not os.path.isfile(file_path):
+        if not result_exists(file_path):
             return Response({"error": "Entry is not a file"}, status=status.HTTP_404_NOT_FOUND)
 
         file_extension = os.path.splitext(file_path)[1].lower()
@@ -65,12 +97,13 @@ class FileViewSet(viewsets.ViewSet):
             ".jpeg": "image/jpeg",
         }
 
-        if file_extension in [".png", ".jpg", ".jpeg"]:
-            return FileResponse(open(file_path, "rb"), content_type=mime_types[file_extension])
-        else:
-            with open(file_path) as file:
-                content = file.read()
-            return HttpResponse(content, content_type=mime_types.get(file_extension, "text/plain"))
+        return serve_file(
+            request,
+            file_path,
+            content_type=mime_types.get(file_extension, "text/plain"),
+            accel_redirect_prefix=settings.FILES_ACCEL_REDIRECT_PREFIX,
+            immutable=self.is_final_result_path(file_path),
+        )
 
     @action(detail=False, methods=["GET"], url_path="download")
     def download_file(self, request):
@@ -78,7 +111,38 @@ class FileViewSet(viewsets.ViewSet):
         if not self.is_safe_path(settings.BASE_LOCAL_RESULTS_DIR, file_path):
             return Response({"error": "Invalid directory path"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not os.path.exists(file_path):
+        if not self.exists_or_render(file_path):
             return Response({"error": "File does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
-        return FileResponse(open(file_path, "rb"), as_attachment=True)
+        if not result_exists(file_path):
+            return Response({"error": "Entry is not a file"}, status=status.HTTP_404_NOT_FOUND)
+
+        return serve_file(
+            request,
+            file_path,
+            as_attachment=True,
+            accel_redirect_prefix=settings.FILES_ACCEL_REDIRECT_PREFIX,
+            immutable=self.is_final_result_path(file_path),
+        )
+
+    @action(detail=False, methods=["GET"], url_path="archive")
+    def download_archive(self, request):
+        dir_path = request.query_params.get("dir", "")
+        if not self.is_safe_path(settings.BASE_LOCAL_RESULTS_DIR, dir_path):
+            return Response({"error": "Invalid directory path"}, status=status.HTTP_400_BAD_REQUEST)
+
+        archive_format = request.query_params.get("format", "zip")
+        if archive_format not in ARCHIVE_FORMATS:
+            return Response({"error": "Invalid archive format"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not os.path.isdir(dir_path):
+            return Response({"error": "Directory does not exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Files are listed upfront (sizes are part of the archive headers), then read while streaming
+        pattern = request.query_params.get("glob") or None
+        entries = list_archive_entries(dir_path, settings.BASE_LOCAL_RESULTS_DIR, pattern)
+        iter_archive, content_type, extension = ARCHIVE_FORMATS[archive_format]
+        filename = os.path.basename(os.path.normpath(dir_path)) + extension
+        response = StreamingHttpResponse((chunk for chunk in iter_archive(entries) if chunk), content_type=content_type)
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
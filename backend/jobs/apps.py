@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class JobsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "jobs"
+
+    def ready(self):
+        if settings.HTCONDOR_FAKE_DIR:
+            from utils.htcondor.fake import FakeHTCondor
+
+            FakeHTCondor(settings.HTCONDOR_FAKE_DIR).install()
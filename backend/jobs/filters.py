@@ -13,4 +13,5 @@ class JobFilter(filters.FilterSet):
             "action": ["exact"],
             "created_by": ["exact"],
             "status": ["exact"],
+            "backend": ["exact"],
         }
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jobs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="condor_schedd",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="condor_cluster_id",
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="condor_work_dir",
+            field=models.TextField(default=""),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="condor_results_dir",
+            field=models.TextField(default=""),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jobs", "0002_job_condor_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="backend",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="routing",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="started_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+    ]
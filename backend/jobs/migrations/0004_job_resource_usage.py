@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jobs", "0003_job_routing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="resource_usage",
+            field=models.JSONField(default=dict),
+        ),
+    ]
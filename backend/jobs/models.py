@@ -6,10 +6,16 @@ from django.db import models
 class JobStatus:
     PENDING = "PENDING"
     STARTED = "STARTED"
+    SYNCING = "SYNCING"  # HTCondor jobs, while their results are copied locally
     SUCCESS = "SUCCESS"
     FAILURE = "FAILURE"
 
 
+class JobBackend:
+    LOCAL = "local"
+    HTCONDOR = "htcondor"
+
+
 class Job(models.Model):
     id = models.UUIDField(primary_key=True, editable=False)
     name = models.CharField(max_length=255)
@@ -18,9 +24,17 @@ class Job(models.Model):
     created_by = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, default=None)
     status = models.CharField(max_length=255, default=JobStatus.PENDING)
     results_dir = models.TextField(default="")
     traceback = models.TextField(default="")
+    backend = models.CharField(max_length=255, default="")
+    routing = models.JSONField(default=dict)
+    condor_schedd = models.CharField(max_length=255, default="")
+    condor_cluster_id = models.IntegerField(null=True, default=None)
+    condor_work_dir = models.TextField(default="")
+    condor_results_dir = models.TextField(default="")
+    resource_usage = models.JSONField(default=dict)
 
     class Meta:
         db_table = "tx_jobs"
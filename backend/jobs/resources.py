@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+
+from .models import Job
+
+
+# CERN HTCondor job flavours and their maximum runtime (seconds), shortest first
+JOB_FLAVOURS = (
+    ("espresso", 20 * 60),
+    ("microcentury", 60 * 60),
+    ("longlunch", 2 * 60 * 60),
+    ("workday", 8 * 60 * 60),
+    ("tomorrow", 24 * 60 * 60),
+    ("testmatch", 3 * 24 * 60 * 60),
+    ("nextweek", 7 * 24 * 60 * 60),
+)
+
+# Requests used until there is enough history for the action
+DEFAULT_REQUEST_MEMORY = 10240  # MB
+DEFAULT_REQUEST_DISK = 252000  # KB
+DEFAULT_JOB_FLAVOUR = "espresso"
+
+MIN_REQUEST_MEMORY = 2048
+MAX_REQUEST_MEMORY = 20480
+MIN_REQUEST_DISK = 100000
+LUMIS_PER_CPU = 20000
+HEADROOM = 1.5
+HISTORY_SIZE = 50
+MIN_HISTORY_SIZE = 5
+
+
+def predict_peak(samples: list[tuple[float, float]], n_lumis: int) -> float | None:
+    """
+    Peak value for `n_lumis` lumisections from (lumisections, measured peak) samples,
+    never less than the largest peak measured for a smaller or equal input
+    """
+    if len(samples) < MIN_HISTORY_SIZE:
+        return None
+
+    lumis = np.array([sample[0] for sample in samples], dtype=np.float64)
+    peaks = np.array([sample[1] for sample in samples], dtype=np.float64)
+    prediction = peaks.max()
+    if np.ptp(lumis) > 0:
+        slope, intercept = np.polyfit(lumis, peaks, 1)
+        prediction = intercept + max(slope, 0.0) * n_lumis
+
+    smaller_inputs = peaks[lumis <= n_lumis]
+    if len(smaller_inputs) > 0:
+        prediction = max(prediction, smaller_inputs.max())
+    return float(prediction)
+
+
+def size_htcondor_job(action: str, n_lumis: int | None, max_cpus: int) -> dict:
+    """
+    HTCondor resource requests (`create_submit_file` arguments) for a job of `action`, from
+    the input size and the resources measured on the latest finished jobs of the same action
+    """
+    request = {
+        "request_cpus": max_cpus,
+        "request_memory": DEFAULT_REQUEST_MEMORY,
+        "request_disk": DEFAULT_REQUEST_DISK,
+        "job_flavour": DEFAULT_JOB_FLAVOUR,
+    }
+    if n_lumis is None:
+        return request
+
+    request["request_cpus"] = min(max_cpus, max(1, math.ceil(n_lumis / LUMIS_PER_CPU)))
+
+    jobs = (
+        Job.objects.filter(action=action, resource_usage__has_key="MemoryUsage", routing__has_key="estimated_lumis")
+        .exclude(routing__has_key="dag")
+        .order_by("-created_at")
+        .values("routing", "resource_usage")[:HISTORY_SIZE]
+    )
+    samples = [(job["routing"]["estimated_lumis"], job["resource_usage"]) for job in jobs]
+    memory, disk, wall_time = (
+        predict_peak([(lumis, usage[key]) for lumis, usage in samples if usage.get(key)], n_lumis)
+        for key in ("MemoryUsage", "DiskUsage", "RemoteWallClockTime")
+    )
+    if memory is not None:
+        request["request_memory"] = int(min(max(memory * HEADROOM, MIN_REQUEST_MEMORY), MAX_REQUEST_MEMORY))
+    if disk is not None:
+        request["request_disk"] = int(max(disk * HEADROOM, MIN_REQUEST_DISK))
+    if wall_time is not None:
+        flavours = [name for name, max_runtime in JOB_FLAVOURS if max_runtime >= wall_time * HEADROOM]
+        request["job_flavour"] = flavours[0] if flavours else JOB_FLAVOURS[-1][0]
+
+    return request
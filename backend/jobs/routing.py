@@ -0,0 +1,136 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumicache.storage import FileCache
+
+from .models import Job, JobBackend, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+# Fallbacks when there is no cached metadata or not enough history
+DEFAULT_LUMIS_PER_RUN = 500
+DEFAULT_RUNS_PER_CYCLE = 15
+DEFAULT_COST_MODEL = {
+    JobBackend.LOCAL: (30.0, 0.02),  # (seconds, seconds per lumisection)
+    JobBackend.HTCONDOR: (900.0, 0.005),  # Intercept accounts for the condor queue wait and environment setup
+}
+HISTORY_SIZE = 50
+MIN_HISTORY_SIZE = 5
+
+
+def estimate_lumis(class_name: str, dataset_name: str, run_list: list[int]) -> tuple[int, int]:
+    """
+    Number of lumisections of `run_list` according to the RR/OMS lumis cache,
+    runs not cached yet count as `DEFAULT_LUMIS_PER_RUN`
+
+    Only the local cache (LUMI_CACHE_DIR) is read, runs fetched by HTCondor jobs
+    alone (BASE_CONDOR_CACHE_DIR is on the remote side) are not cached yet.
+    Return the estimate and how many runs were found in the cache.
+    """
+    if not settings.LUMI_CACHE_DIR:
+        return len(run_list) * DEFAULT_LUMIS_PER_RUN, 0
+
+    storage = FileCache(settings.LUMI_CACHE_DIR, RunRegistryLumisCache.NAMESPACE)
+    n_lumis = 0
+    n_cached = 0
+    for run_number in run_list:
+        # Peeked, estimating must not keep entries from being evicted
+        entry = storage.peek(RunRegistryLumisCache.make_key(class_name, dataset_name, run_number))
+        if entry is None:
+            n_lumis += DEFAULT_LUMIS_PER_RUN
+            continue
+        n_cached += 1
+        n_lumis += sum(joint_range["end"] - joint_range["start"] + 1 for joint_range in entry["payload"])
+
+    return n_lumis, n_cached
+
+
+class CostModel:
+    """
+    Linear model of a job duration (from start to finish) as a function
+    of its lumisections, fitted on the latest successful jobs of the same action
+    """
+
+    def __init__(self, action: str, backend: str):
+        self.action = action
+        self.backend = backend
+        self.intercept, self.slope = DEFAULT_COST_MODEL[backend]
+        self.n_samples = 0
+
+    def fit(self) -> "CostModel":
+        jobs = (
+            Job.objects.filter(action=self.action, status=JobStatus.SUCCESS, started_at__isnull=False)
+            .filter(routing__has_key="estimated_lumis")
+            .order_by("-created_at")
+            .values("started_at", "modified_at", "routing")[:HISTORY_SIZE]
+        )
+        lumis = np.array([job["routing"]["estimated_lumis"] for job in jobs], dtype=np.float64)
+        durations = np.array([(job["modified_at"] - job["started_at"]).total_seconds() for job in jobs])
+        self.n_samples = len(jobs)
+        if self.n_samples < MIN_HISTORY_SIZE or np.ptp(lumis) == 0:
+            return self
+
+        # A negative slope or intercept would only come from noise
+        slope, intercept = np.polyfit(lumis, durations, 1)
+        self.slope = max(float(slope), 0.0)
+        self.intercept = max(float(intercept), 0.0)
+        return self
+
+    def predict(self, n_lumis: int) -> float:
+        return self.intercept + self.slope * n_lumis
+
+
+def local_queue_wait() -> float:
+    """
+    Estimated seconds until a local worker is free, from the predictions of the queued and running local jobs
+    """
+    now = timezone.now()
+    wait = 0.0
+    for job in Job.objects.filter(backend=JobBackend.LOCAL, status__in=(JobStatus.PENDING, JobStatus.STARTED)):
+        predicted = (job.routing or {}).get("predicted", {}).get(JobBackend.LOCAL, 0.0)
+        elapsed = (now - job.started_at).total_seconds() if job.started_at else 0.0
+        wait += max(predicted - elapsed, 0.0)
+
+    return wait / max(settings.LOCAL_JOB_CONCURRENCY, 1)
+
+
+def route_job(local_action: str, htcondor_action: str, n_lumis: int, n_cached_runs: int = 0) -> dict:
+    """
+    Pick the backend expected to finish first, local jobs larger than
+    `settings.ROUTING_LOCAL_MAX_LUMIS` always go to HTCondor (memory)
+    """
+    start_time = time.monotonic()
+    local_model = CostModel(local_action, JobBackend.LOCAL).fit()
+    htcondor_model = CostModel(htcondor_action, JobBackend.HTCONDOR).fit()
+    queue_wait = local_queue_wait()
+    predicted = {
+        JobBackend.LOCAL: local_model.predict(n_lumis),
+        JobBackend.HTCONDOR: htcondor_model.predict(n_lumis),
+    }
+
+    if n_lumis > settings.ROUTING_LOCAL_MAX_LUMIS:
+        backend = JobBackend.HTCONDOR
+        reason = "too large for a local worker"
+    elif queue_wait + predicted[JobBackend.LOCAL] <= predicted[JobBackend.HTCONDOR]:
+        backend = JobBackend.LOCAL
+        reason = "expected to finish first"
+    else:
+        backend = JobBackend.HTCONDOR
+        reason = "expected to finish first"
+
+    decision = {
+        "backend": backend,
+        "reason": reason,
+        "estimated_lumis": n_lumis,
+        "cached_runs": n_cached_runs,
+        "local_queue_wait": queue_wait,
+        "predicted": predicted,
+        "history_size": {JobBackend.LOCAL: local_model.n_samples, JobBackend.HTCONDOR: htcondor_model.n_samples},
+    }
+    logger.info("Routing decision in %.3fs: %s", time.monotonic() - start_time, decision)
+    return decision
@@ -3,6 +3,7 @@ from .run_full_certification.task import run_full_certification_htcondor_task, r
 from .run_full_lumi_analysis.task import run_full_lumi_analysis_htcondor_task, run_full_lumi_analysis_task
 from .run_json_production.task import run_json_production_htcondor_task, run_json_production_task
 from .run_lumiloss.task import run_lumiloss_htcondor_task, run_lumiloss_task
+from .track_htcondor_jobs.task import sync_htcondor_results_task, track_htcondor_jobs_task
 
 
 __all__ = [
@@ -16,4 +17,6 @@ __all__ = [
     "run_json_production_htcondor_task",
     "run_lumiloss_task",
     "run_lumiloss_htcondor_task",
+    "track_htcondor_jobs_task",
+    "sync_htcondor_results_task",
 ]
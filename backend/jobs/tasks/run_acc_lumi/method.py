@@ -1,11 +1,15 @@
-import json
 import os
 
 import matplotlib
 from libdc3.methods.acc_lumi_analyzer import AccLuminosityAnalyzer
 from libdc3.methods.bril_actions import BrilActions
-from libdc3.methods.json_producer import JsonProducer
 from libdc3.methods.rr_actions import RunRegistryActions
+from utils.lumicache.bril import BrilLumisCache
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumisections.columnar import LumisectionTable
+from utils.lumisections.json_producer import MultiJsonProducer, json_profiles
+from utils.parallel.plots import PlotStage
+from utils.results.writer import STORE_PLAIN, write_cms_json
 
 
 matplotlib.use("Agg")
@@ -35,26 +39,25 @@ def run_acc_lumi(job: dict):
     """
     # Fetch RR and OMS lumisection flags/bits
     rra = RunRegistryActions(class_name=job["params"]["class_name"], dataset_name=job["params"]["dataset_name"])
-    offline_lumis = rra.multi_fetch_rr_oms_joint_lumis(run_list=job["params"]["run_list"])
-    del rra
+    rrc = RunRegistryLumisCache(rra, cache_dir=job.get("cache_dir"))
+    offline_lumis = LumisectionTable.from_records(
+        rrc.multi_fetch_rr_oms_joint_lumis(run_list=job["params"]["run_list"])
+    )
+    del rra, rrc
 
     # Genrate all jsons
-    producer = JsonProducer(rr_oms_lumis=offline_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
-    golden_json = producer.generate(
-        oms_flags=job["params"]["golden_json_oms_flags"], rr_flags=job["params"]["golden_json_rr_flags"]
-    )
-    muon_json = producer.generate(
-        oms_flags=job["params"]["muon_json_oms_flags"], rr_flags=job["params"]["muon_json_rr_flags"]
-    )
+    producer = MultiJsonProducer(rr_oms_lumis=offline_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
+    jsons = producer.generate(json_profiles(job["params"], names=("golden", "muon")))
     del producer
 
     # Save JSONs
+    results_storage = job.get("results_storage", STORE_PLAIN)
     base_path = os.path.join(job["results_dir"], "jsons")
     os.makedirs(base_path, exist_ok=True)
-    with open(os.path.join(base_path, "golden.json"), "w") as f:
-        json.dump(golden_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "muon.json"), "w") as f:
-        json.dump(muon_json, f, ensure_ascii=False, indent=4)
+    for name, compact_json in jsons.items():
+        write_cms_json(os.path.join(base_path, f"{name}.json"), compact_json, storage=results_storage)
+    golden_json, muon_json = jsons["golden"], jsons["muon"]
+    del jsons
 
     # Fetch BRIL lumisections
     min_run = min(job["params"]["run_list"])
@@ -67,9 +70,12 @@ def run_acc_lumi(job: dict):
         amodetag=job["params"]["bril_amodetag"],
         normtag=job["params"]["bril_normtag"],
     )
-    bril_lumis = ba.fetch_lumis(begin=min_run, end=max_run).get("detailed")
+    bc = BrilLumisCache(ba, cache_dir=job.get("cache_dir"))
     used_keys = ["run_number", "ls_number", "delivered", "recorded", "datetime"]
-    bril_lumis = [{key: value for key, value in item.items() if key in used_keys} for item in bril_lumis]
+    bril_lumis = LumisectionTable.from_records(bc.fetch_lumis(begin=min_run, end=max_run).get("detailed"), used_keys)
+    bril_lumis = bril_lumis.to_records()
+
+    plot_stage = PlotStage(workers=job.get("workers"))
 
     # Generate Acc Luminosity plots for golden JSON
     acc_lumi_plots_path = os.path.join(job["results_dir"], "acc_lumi/golden")
@@ -85,8 +91,7 @@ def run_acc_lumi(job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del acc_lumi, golden_json
 
     # Generate Acc Luminosity plots for muon JSON
@@ -103,6 +108,8 @@ def run_acc_lumi(job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del acc_lumi
+
+    # Render all plots
+    plot_stage.render()
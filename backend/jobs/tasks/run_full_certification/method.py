@@ -1,51 +1,205 @@
 import json
 import os
+import pickle
+import shutil
 
 import matplotlib
 from libdc3.methods.acc_lumi_analyzer import AccLuminosityAnalyzer
 from libdc3.methods.bril_actions import BrilActions
 from libdc3.methods.era_plotter import EraPlotter
-from libdc3.methods.json_producer import JsonProducer
 from libdc3.methods.lumiloss_analyzer import LumilossAnalyzer
 from libdc3.methods.lumiloss_plotter import LumilossPlotter
 from libdc3.methods.rr_actions import RunRegistryActions
 from libdc3.methods.t0_actions import T0Actions
 from libdc3.services.caf.client import CAF
+from utils.lumicache.bril import BrilLumisCache
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumiplots.lazy import save_lumiloss_manifest
+from utils.lumisections.columnar import LumisectionTable
+from utils.lumisections.json_producer import MultiJsonProducer, json_profiles
+from utils.lumisections.partition import JsonIndex, RunIndex
+from utils.lumisections.run_selection import RunSelection
+from utils.parallel.plots import PlotStage
+from utils.parallel.pool import resolve_workers, run_in_pool
+from utils.results.writer import STORE_PLAIN, write_cms_json, write_json, write_text
 
 
 matplotlib.use("Agg")
 
+# Rough peak memory (in bytes) of a single era analysis, used to limit the number of workers
+ERA_WORKER_MEMORY = 2 * 1024**3
+
+# HTCondor DAG mode: intermediate data (relative to the results directory) and eras sub-DAG
+DAG_DATA_DIR = ".dag"
+ERAS_DAG_FNAME = "eras.dag"
+ERA_SUBMIT_FNAME = "era.sub"
+
+
+def create_eras_dag(n_eras: int) -> str:
+    if n_eras == 0:
+        # A DAG needs at least one node
+        return f"JOB noop {ERA_SUBMIT_FNAME} NOOP\n"
+
+    lines = []
+    for idx in range(n_eras):
+        lines.append(f"JOB era_{idx} {ERA_SUBMIT_FNAME}")
+        lines.append(f'VARS era_{idx} era_index="{idx}"')
+    return "\n".join(lines) + "\n"
+
+
+def analyze_era(
+    params: dict,
+    era_outpath: str,
+    era_name: str,
+    min_run_in_era: int,
+    max_run_in_era: int,
+    offline_lumis_in_era: LumisectionTable,
+    bril_lumis_in_era: LumisectionTable,
+    pjson_in_era: dict,
+    gjson_in_era: dict,
+    mjson_in_era: dict,
+    low_lumi_runs_in_era: RunSelection,
+    ignore_runs: RunSelection,
+    plot_workers: int | None = None,
+    lazy_plots: bool = False,
+    results_storage: str = STORE_PLAIN,
+) -> dict:
+    """
+    Save the era JSONs, analyse the era lumiloss, plot it and return the era statistics
 
-def run_full_certification(job: dict):
+    Defined at module level so it can be dispatched to a worker process
     """
-    Parameters needed:
-    - class_name
-    - dataset_name
-    - cycles
-    - min_run
-    - max_run
-    - ignore_runs
-    - ignore_hlt_emergency
-    - pre_json_oms_flags
-    - golden_json_oms_flags
-    - golden_json_rr_flags
-    - muon_json_oms_flags
-    - muon_json_rr_flags
-    - bril_brilws_version
-    - bril_unit
-    - bril_low_lumi_thr
-    - bril_beamstatus
-    - bril_amodetag
-    - bril_normtag
-    - eras_prefix
-    - ignore_eras
-    - lumiloss_dcs_flags
-    - lumiloss_subsystems_flags
-    - lumiloss_subdetectors_flags
-    - target_lumiloss_unit
-    - acc_lumi_year
-    - acc_lumi_beam_energy
-    - acc_lumi_additional_label_on_plot
+    os.makedirs(era_outpath, exist_ok=True)
+
+    # libdc3 analyzers work on one dict per lumisection
+    offline_lumis_in_era = offline_lumis_in_era.to_records()
+    bril_lumis_in_era = bril_lumis_in_era.to_records()
+
+    # Check lumiloss
+    lumiloss_for_era = LumilossAnalyzer(
+        rr_oms_lumis=offline_lumis_in_era,
+        bril_lumis=bril_lumis_in_era,
+        pre_json=pjson_in_era,
+        dc_json=gjson_in_era,
+        low_lumi_runs=low_lumi_runs_in_era,
+        ignore_runs=ignore_runs,
+        bril_unit=params["bril_unit"],
+        target_unit=params["target_lumiloss_unit"],
+    )
+    lumiloss_results = lumiloss_for_era.analyze(
+        params["lumiloss_dcs_flags"],
+        params["lumiloss_subsystems_flags"],
+        params["lumiloss_subdetectors_flags"],
+    )
+    txt_inclusive = lumiloss_for_era.format_lumiloss_by_run(data=lumiloss_results["subsystem_run_inclusive_loss"])
+    txt_exclusive = lumiloss_for_era.format_lumiloss_by_run(data=lumiloss_results["subsystem_run_exclusive_loss"])
+
+    # Save jsons
+    era_jsons_path = os.path.join(era_outpath, "jsons")
+    os.makedirs(era_jsons_path, exist_ok=True)
+
+    write_cms_json(os.path.join(era_jsons_path, "pre.json"), pjson_in_era, storage=results_storage)
+    write_cms_json(os.path.join(era_jsons_path, "golden.json"), gjson_in_era, storage=results_storage)
+    write_cms_json(os.path.join(era_jsons_path, "muon.json"), mjson_in_era, storage=results_storage)
+
+    # Save lumiloss results
+    lumiloss_data_path = os.path.join(era_outpath, "lumiloss/data")
+    os.makedirs(lumiloss_data_path, exist_ok=True)
+
+    for key, value in lumiloss_results.items():
+        write_json(os.path.join(lumiloss_data_path, f"{key}.json"), value, storage=results_storage)
+    write_text(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), txt_inclusive, storage=results_storage)
+    write_text(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), txt_exclusive, storage=results_storage)
+    del txt_inclusive, txt_exclusive
+
+    # Plot lumiloss
+    plot_stage = PlotStage(workers=plot_workers)
+    lumiloss_plots_path = os.path.join(era_outpath, "lumiloss/plots")
+    os.makedirs(lumiloss_plots_path, exist_ok=True)
+
+    if lazy_plots:
+        # Only register the plots, the files API renders them when first requested
+        save_lumiloss_manifest(
+            lumiloss_plots_path, lumiloss_data_path, params["target_lumiloss_unit"], lumiloss_results
+        )
+    else:
+        plots = LumilossPlotter(
+            lumiloss=lumiloss_results, unit=params["target_lumiloss_unit"], output_path=lumiloss_plots_path
+        )
+        plot_stage.add(
+            plots,
+            "plot_subsystem_dqmflag_loss",
+            "plot_dcs_loss",
+            "plot_cms_inclusive_loss",
+            "plot_cms_exclusive_loss",
+            "plot_cms_detailed_fraction_exclusive_loss",
+            "plot_inclusive_loss_by_subdetector",
+            "plot_exclusive_loss_by_subdetector",
+            "plot_fraction_of_exclusive_loss_by_subdetector",
+        )
+        del plots
+
+    # Plot acc luminosity for goldenJSON
+    acc_lumi_plots_path = os.path.join(era_outpath, "acc_lumi/golden")
+    os.makedirs(acc_lumi_plots_path, exist_ok=True)
+
+    acc_lumi = AccLuminosityAnalyzer(
+        dc_json=gjson_in_era,
+        bril_lumis=bril_lumis_in_era,
+        bril_amodetag=params["bril_amodetag"],
+        bril_unit=params["bril_unit"],
+        target_unit=params["target_acclumi_unit"],
+        year=params["acc_lumi_year"],
+        beam_energy=params["acc_lumi_beam_energy"],
+        output_path=acc_lumi_plots_path,
+        additional_label_on_plot=params["acc_lumi_additional_label_on_plot"],
+    )
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
+    del acc_lumi
+
+    # Plot acc luminosity for muonJSON
+    acc_lumi_plots_path = os.path.join(era_outpath, "acc_lumi/muon")
+    os.makedirs(acc_lumi_plots_path, exist_ok=True)
+
+    acc_lumi = AccLuminosityAnalyzer(
+        dc_json=mjson_in_era,
+        bril_lumis=bril_lumis_in_era,
+        bril_amodetag=params["bril_amodetag"],
+        bril_unit=params["bril_unit"],
+        target_unit=params["target_acclumi_unit"],
+        year=params["acc_lumi_year"],
+        beam_energy=params["acc_lumi_beam_energy"],
+        output_path=acc_lumi_plots_path,
+        additional_label_on_plot=params["acc_lumi_additional_label_on_plot"],
+    )
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
+    del acc_lumi
+
+    plot_stage.render()
+
+    return {
+        "era": era_name,
+        "start_run": min_run_in_era,
+        "end_run": max_run_in_era,
+        "lhc_delivered": lumiloss_for_era.total_delivered,
+        "cms_recorded": lumiloss_for_era.total_recorded,
+        "total_low_lumi": lumiloss_for_era.total_low_lumi,
+        "total_ignore_runs": lumiloss_for_era.total_ignore_runs,
+        "total_not_stable_beams": lumiloss_for_era.total_not_stable_beams,
+        "total_not_in_oms_rr": lumiloss_for_era.total_not_in_oms_rr,
+        "dc_processed": lumiloss_for_era.total_processed,
+        "total_loss": lumiloss_for_era.total_loss,
+        "dc_certified": lumiloss_for_era.total_certified,
+        "processed_eff": lumiloss_for_era.processed_eff,
+        "data_taking_eff": lumiloss_for_era.data_taking_eff,
+        "recorded_eff": lumiloss_for_era.recorded_eff,
+    }
+
+
+def prepare_eras(job: dict) -> tuple[list[dict], dict]:
+    """
+    Fetch and partition all data, save the global JSONs and return
+    one `analyze_era` task per era plus what `summarize_eras` needs
     """
     rra = RunRegistryActions(class_name=job["params"]["class_name"], dataset_name=job["params"]["dataset_name"])
 
@@ -63,37 +217,34 @@ def run_full_certification(job: dict):
     all_runs = [dataset["run_number"] for dataset in all_datasets]
 
     # Fetch RR and OMS lumisections
-    offline_lumis = rra.multi_fetch_rr_oms_joint_lumis(run_list=all_runs)
-    del rra
+    rrc = RunRegistryLumisCache(rra, cache_dir=job.get("cache_dir"))
+    offline_lumis = LumisectionTable.from_records(rrc.multi_fetch_rr_oms_joint_lumis(run_list=all_runs))
+    del rra, rrc
 
     # Check which runs are not in the DCSOnly JSON
     caf = CAF(job["params"]["class_name"], kind="dcs")
     dcs_json = caf.download(latest=True)
-    runs_not_in_dcs_json = [run for run in all_runs if str(run) not in dcs_json.keys()]
+    runs_not_in_dcs_json = RunSelection(run for run in all_runs if str(run) not in dcs_json.keys())
+    runs_in_all_cycles = RunSelection(runs_in_all_cycles)
     del caf, dcs_json
 
     # Genrate all jsons
-    elegible_runs = [*runs_in_all_cycles, *runs_not_in_dcs_json]
-    elegible_lumis = [lumi for lumi in offline_lumis if lumi["run_number"] in elegible_runs]
-    producer = JsonProducer(rr_oms_lumis=elegible_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
-    pre_json = producer.generate(oms_flags=job["params"]["pre_json_oms_flags"])
-    golden_json = producer.generate(
-        oms_flags=job["params"]["golden_json_oms_flags"], rr_flags=job["params"]["golden_json_rr_flags"]
-    )
-    muon_json = producer.generate(
-        oms_flags=job["params"]["muon_json_oms_flags"], rr_flags=job["params"]["muon_json_rr_flags"]
+    elegible_runs = runs_in_all_cycles | runs_not_in_dcs_json
+    elegible_lumis = offline_lumis.filter_runs(elegible_runs)
+    producer = MultiJsonProducer(
+        rr_oms_lumis=elegible_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"]
     )
+    jsons = producer.generate(json_profiles(job["params"]))
     del producer, elegible_runs, elegible_lumis
 
     # Save JSONs
+    results_storage = job.get("results_storage", STORE_PLAIN)
     base_path = os.path.join(job["results_dir"], "jsons")
     os.makedirs(base_path, exist_ok=True)
-    with open(os.path.join(base_path, "pre.json"), "w") as f:
-        json.dump(pre_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "golden.json"), "w") as f:
-        json.dump(golden_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "muon.json"), "w") as f:
-        json.dump(muon_json, f, ensure_ascii=False, indent=4)
+    for name, compact_json in jsons.items():
+        write_cms_json(os.path.join(base_path, f"{name}.json"), compact_json, storage=results_storage)
+    pre_json, golden_json, muon_json = jsons["pre"], jsons["golden"], jsons["muon"]
+    del jsons
 
     # Fetch BRIL lumisections
     ba = BrilActions(
@@ -104,56 +255,45 @@ def run_full_certification(job: dict):
         amodetag=job["params"]["bril_amodetag"],
         normtag=job["params"]["bril_normtag"],
     )
-    bril_lumis = ba.fetch_lumis(begin=min_run, end=max_run).get("detailed")
+    bc = BrilLumisCache(ba, cache_dir=job.get("cache_dir"))
     used_keys = ["run_number", "ls_number", "delivered", "recorded", "datetime"]
-    bril_lumis = [{key: value for key, value in item.items() if key in used_keys} for item in bril_lumis]
-    bril_lumis_by_run = ba.agg_by_run(bril_lumis)
+    bril_lumis = LumisectionTable.from_records(bc.fetch_lumis(begin=min_run, end=max_run).get("detailed"), used_keys)
+    bril_lumis_by_run = ba.agg_by_run(bril_lumis.iter_records())
 
     # Fetch T0 eras
     t0a = T0Actions()
     eras = t0a.eras_history(era=job["params"]["eras_prefix"])
     eras = [era for era in eras if era["era"] not in job["params"]["ignore_eras"]]
 
-    # Analyse lumiloss and generate plots by era
-    eras_statistics = []
-    ignore_runs = job["params"]["ignore_runs"].copy()
+    # Index all data by run number once, so each era is sliced with bisect instead of a full scan
+    # (lumisection tables are already sorted by run number)
+    all_runs_index = RunIndex(all_runs, key=None)
+    bril_lumis_by_run_index = RunIndex(bril_lumis_by_run)
+    pre_json_index = JsonIndex(pre_json)
+    golden_json_index = JsonIndex(golden_json)
+    muon_json_index = JsonIndex(muon_json)
+    del bril_lumis_by_run
+
+    # Classify runs era by era (ignored runs accumulate from one era to the next)
+    era_tasks = []
+    ignore_runs = RunSelection(job["params"]["ignore_runs"])
     for era in eras:
         era_name = era["era"]
         min_run_in_era = era["min_run"]
         max_run_in_era = era["max_run"]
 
         # All runs (from RR datasets) in this interval
-        runs_in_era = [run for run in all_runs if run >= min_run_in_era and run <= max_run_in_era]
+        runs_in_era = all_runs_index.between(min_run_in_era, max_run_in_era)
         if len(runs_in_era) == 0:
             continue
 
         # Filter data to era scope
-        offline_lumis_in_era = [
-            lumi
-            for lumi in offline_lumis
-            if lumi["run_number"] >= min_run_in_era and lumi["run_number"] <= max_run_in_era
-        ]
-        pjson_in_era = {
-            run: lumi_ranges for run, lumi_ranges in pre_json.items() if run >= min_run_in_era and run <= max_run_in_era
-        }
-        gjson_in_era = {
-            run: lumi_ranges
-            for run, lumi_ranges in golden_json.items()
-            if run >= min_run_in_era and run <= max_run_in_era
-        }
-        mjson_in_era = {
-            run: lumi_ranges
-            for run, lumi_ranges in muon_json.items()
-            if run >= min_run_in_era and run <= max_run_in_era
-        }
-        bril_lumis_in_era = [
-            lumi for lumi in bril_lumis if lumi["run_number"] >= min_run_in_era and lumi["run_number"] <= max_run_in_era
-        ]
-        bril_lumis_by_run_in_era = [
-            run
-            for run in bril_lumis_by_run
-            if run["run_number"] >= min_run_in_era and run["run_number"] <= max_run_in_era
-        ]
+        offline_lumis_in_era = offline_lumis.between(min_run_in_era, max_run_in_era)
+        pjson_in_era = pre_json_index.between(min_run_in_era, max_run_in_era)
+        gjson_in_era = golden_json_index.between(min_run_in_era, max_run_in_era)
+        mjson_in_era = muon_json_index.between(min_run_in_era, max_run_in_era)
+        bril_lumis_in_era = bril_lumis.between(min_run_in_era, max_run_in_era)
+        bril_lumis_by_run_in_era = bril_lumis_by_run_index.between(min_run_in_era, max_run_in_era)
 
         # It is possible that a run included in an old cycle (from eraB for example) wasn't low lumi at the time
         # and now (with normtag updates) is considered low lumi.
@@ -163,12 +303,12 @@ def run_full_certification(job: dict):
         # - low_lumi_runs
         #
         # We need to remove this run from the `low_lumi_runs` since it was certified in the past!
-        runs_from_cycles_in_era = [run for run in runs_in_all_cycles if run >= min_run_in_era and run <= max_run_in_era]
-        low_lumi_runs_in_era = [
+        runs_from_cycles_in_era = runs_in_all_cycles.between(min_run_in_era, max_run_in_era)
+        low_lumi_runs_in_era = RunSelection(
             run["run_number"]
             for run in bril_lumis_by_run_in_era
             if run["run_number"] not in runs_from_cycles_in_era and run["has_low_recorded"]
-        ]
+        )
 
         # It is possible that the last era contains runs that weren't sent to certification yet
         # because at the time of the latest DC call these runs hadn't all datasets in DQM GUI.
@@ -179,172 +319,69 @@ def run_full_certification(job: dict):
         # - Shouldn't be in low lumi list
         # - Shouldn't be in ignore runs list
         # - Shouldn't be in not in DCSOnly list
-        runs_not_in_dcs_json_for_era = [
-            run for run in runs_in_era if run in runs_not_in_dcs_json and run not in low_lumi_runs_in_era
-        ]
-        classified_runs = [*runs_not_in_dcs_json_for_era, *runs_from_cycles_in_era, *low_lumi_runs_in_era, *ignore_runs]
-        other_runs_in_era = [run for run in runs_in_era if run not in classified_runs]
-        ignore_runs.extend(other_runs_in_era)
-
-        # Check lumiloss
-        lumiloss_for_era = LumilossAnalyzer(
-            rr_oms_lumis=offline_lumis_in_era,
-            bril_lumis=bril_lumis_in_era,
-            pre_json=pjson_in_era,
-            dc_json=gjson_in_era,
-            low_lumi_runs=low_lumi_runs_in_era,
-            ignore_runs=ignore_runs,
-            bril_unit=job["params"]["bril_unit"],
-            target_unit=job["params"]["target_lumiloss_unit"],
-        )
-        lumiloss_results = lumiloss_for_era.analyze(
-            job["params"]["lumiloss_dcs_flags"],
-            job["params"]["lumiloss_subsystems_flags"],
-            job["params"]["lumiloss_subdetectors_flags"],
+        runs_not_in_dcs_json_for_era = (runs_not_in_dcs_json - low_lumi_runs_in_era).filter_runs(runs_in_era)
+        classified_runs = RunSelection(
+            runs_not_in_dcs_json_for_era, runs_from_cycles_in_era, low_lumi_runs_in_era, ignore_runs
         )
-        txt_inclusive = lumiloss_for_era.format_lumiloss_by_run(data=lumiloss_results["subsystem_run_inclusive_loss"])
-        txt_exclusive = lumiloss_for_era.format_lumiloss_by_run(data=lumiloss_results["subsystem_run_exclusive_loss"])
-
-        # Setup directory for plots
-        era_outpath = job["results_dir"] + "/eras/" + era_name
-        os.makedirs(era_outpath, exist_ok=True)
-
-        # Save jsons
-        era_jsons_path = os.path.join(era_outpath, "jsons")
-        os.makedirs(era_jsons_path, exist_ok=True)
-
-        fpath = os.path.join(era_jsons_path, "pre.json")
-        with open(fpath, "w") as f:
-            json.dump(pjson_in_era, f, ensure_ascii=False, indent=4)
-
-        fpath = os.path.join(era_jsons_path, "golden.json")
-        with open(fpath, "w") as f:
-            json.dump(gjson_in_era, f, ensure_ascii=False, indent=4)
-
-        fpath = os.path.join(era_jsons_path, "muon.json")
-        with open(fpath, "w") as f:
-            json.dump(mjson_in_era, f, ensure_ascii=False, indent=4)
-
-        # Save lumiloss results
-        lumiloss_data_path = os.path.join(era_outpath, "lumiloss/data")
-        os.makedirs(lumiloss_data_path, exist_ok=True)
-
-        for key, value in lumiloss_results.items():
-            fpath = os.path.join(lumiloss_data_path, f"{key}.json")
-            with open(fpath, "w") as f:
-                json.dump(value, f)
-        with open(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), "w") as f:
-            f.write(txt_inclusive)
-        with open(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), "w") as f:
-            f.write(txt_exclusive)
-        del txt_inclusive, txt_exclusive
-
-        # Plot lumiloss
-        lumiloss_plots_path = os.path.join(era_outpath, "lumiloss/plots")
-        os.makedirs(lumiloss_plots_path, exist_ok=True)
+        other_runs_in_era = classified_runs.exclude_runs(runs_in_era)
+        ignore_runs = ignore_runs | other_runs_in_era
 
-        plots = LumilossPlotter(
-            lumiloss=lumiloss_results, unit=job["params"]["target_lumiloss_unit"], output_path=lumiloss_plots_path
-        )
-        plots.plot_subsystem_dqmflag_loss()
-        plots.plot_dcs_loss()
-        plots.plot_cms_inclusive_loss()
-        plots.plot_cms_exclusive_loss()
-        plots.plot_cms_detailed_fraction_exclusive_loss()
-        plots.plot_inclusive_loss_by_subdetector()
-        plots.plot_exclusive_loss_by_subdetector()
-        plots.plot_fraction_of_exclusive_loss_by_subdetector()
-
-        # Plot acc luminosity for goldenJSON
-        acc_lumi_plots_path = os.path.join(era_outpath, "acc_lumi/golden")
-        os.makedirs(acc_lumi_plots_path, exist_ok=True)
-
-        acc_lumi = AccLuminosityAnalyzer(
-            dc_json=gjson_in_era,
-            bril_lumis=bril_lumis_in_era,
-            bril_amodetag=job["params"]["bril_amodetag"],
-            bril_unit=job["params"]["bril_unit"],
-            target_unit=job["params"]["target_acclumi_unit"],
-            year=job["params"]["acc_lumi_year"],
-            beam_energy=job["params"]["acc_lumi_beam_energy"],
-            output_path=acc_lumi_plots_path,
-            additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
-        )
-        acc_lumi.plot_acc_lumi_by_day()
-        acc_lumi.plot_acc_lumi_by_week()
-        del acc_lumi
-
-        # Plot acc luminosity for muonJSON
-        acc_lumi_plots_path = os.path.join(era_outpath, "acc_lumi/muon")
-        os.makedirs(acc_lumi_plots_path, exist_ok=True)
-
-        acc_lumi = AccLuminosityAnalyzer(
-            dc_json=mjson_in_era,
-            bril_lumis=bril_lumis_in_era,
-            bril_amodetag=job["params"]["bril_amodetag"],
-            bril_unit=job["params"]["bril_unit"],
-            target_unit=job["params"]["target_acclumi_unit"],
-            year=job["params"]["acc_lumi_year"],
-            beam_energy=job["params"]["acc_lumi_beam_energy"],
-            output_path=acc_lumi_plots_path,
-            additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
-        )
-        acc_lumi.plot_acc_lumi_by_day()
-        acc_lumi.plot_acc_lumi_by_week()
-        del acc_lumi, bril_lumis_in_era
-
-        # Save era statistics
-        eras_statistics.append(
+        era_tasks.append(
             {
-                "era": era_name,
-                "start_run": min_run_in_era,
-                "end_run": max_run_in_era,
-                "lhc_delivered": lumiloss_for_era.total_delivered,
-                "cms_recorded": lumiloss_for_era.total_recorded,
-                "total_low_lumi": lumiloss_for_era.total_low_lumi,
-                "total_ignore_runs": lumiloss_for_era.total_ignore_runs,
-                "total_not_stable_beams": lumiloss_for_era.total_not_stable_beams,
-                "total_not_in_oms_rr": lumiloss_for_era.total_not_in_oms_rr,
-                "dc_processed": lumiloss_for_era.total_processed,
-                "total_loss": lumiloss_for_era.total_loss,
-                "dc_certified": lumiloss_for_era.total_certified,
-                "processed_eff": lumiloss_for_era.processed_eff,
-                "data_taking_eff": lumiloss_for_era.data_taking_eff,
-                "recorded_eff": lumiloss_for_era.recorded_eff,
+                "params": job["params"],
+                "era_outpath": os.path.join(job["results_dir"], "eras", era_name),
+                "era_name": era_name,
+                "min_run_in_era": min_run_in_era,
+                "max_run_in_era": max_run_in_era,
+                "offline_lumis_in_era": offline_lumis_in_era,
+                "bril_lumis_in_era": bril_lumis_in_era,
+                "pjson_in_era": pjson_in_era,
+                "gjson_in_era": gjson_in_era,
+                "mjson_in_era": mjson_in_era,
+                "low_lumi_runs_in_era": low_lumi_runs_in_era,
+                "ignore_runs": ignore_runs,
+                "lazy_plots": job.get("lazy_plots", False),
+                "results_storage": results_storage,
             }
         )
+        del bril_lumis_by_run_in_era
 
-        del (
-            pjson_in_era,
-            mjson_in_era,
-            gjson_in_era,
-            offline_lumis_in_era,
-            bril_lumis_by_run_in_era,
-            low_lumi_runs_in_era,
-            lumiloss_for_era,
-            plots,
-            lumiloss_results,
-        )
+    summary = {
+        "min_run": min_run,
+        "max_run": max_run,
+        "golden_json": golden_json,
+        "muon_json": muon_json,
+        "bril_lumis": bril_lumis,
+    }
+    return era_tasks, summary
 
-    del offline_lumis
+
+def summarize_eras(job: dict, summary: dict, eras_statistics: list[dict]):
+    """
+    Plot the eras efficiency and the global accumulated luminosity
+    """
+    results_storage = job.get("results_storage", STORE_PLAIN)
+    min_run, max_run = summary["min_run"], summary["max_run"]
+    golden_json, muon_json = summary["golden_json"], summary["muon_json"]
 
     # Generate combined eras plot
     eras_eff_plots_path = os.path.join(job["results_dir"], "eras")
     os.makedirs(eras_eff_plots_path, exist_ok=True)
 
+    plot_stage = PlotStage(workers=job.get("workers"))
     era_plotter = EraPlotter(eras_statistics, eras_eff_plots_path)
-    era_plotter.plot_dc_efficiency_by_processed_per_era()
-    era_plotter.plot_dc_efficiency_by_recorded_per_era()
+    plot_stage.add(era_plotter, "plot_dc_efficiency_by_processed_per_era", "plot_dc_efficiency_by_recorded_per_era")
 
     acc_lumi_path = os.path.join(job["results_dir"], "acc_lumi")
     os.makedirs(acc_lumi_path, exist_ok=True)
     all_in_stats_path = os.path.join(acc_lumi_path, "stats.json")
-    with open(all_in_stats_path, "w") as f:
-        all_in = {"min_run_rr": min_run, "max_run_rr": max_run, **eras_statistics[-1]}
-        json.dump(all_in, f)
+    all_in = {"min_run_rr": min_run, "max_run_rr": max_run, **eras_statistics[-1]}
+    write_json(all_in_stats_path, all_in, storage=results_storage)
 
     del era_plotter, eras_eff_plots_path
 
+    bril_lumis = summary["bril_lumis"].to_records()
+
     # Generate Acc Luminosity plots for golden JSON
     acc_lumi_plots_path = os.path.join(acc_lumi_path, "golden")
     os.makedirs(acc_lumi_plots_path, exist_ok=True)
@@ -359,8 +396,7 @@ def run_full_certification(job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del acc_lumi, golden_json
 
     # Generate Acc Luminosity plots for muon JSON
@@ -377,6 +413,90 @@ def run_full_certification(job: dict):
         output_path=acc_lumi_plots_path,
         additional_label_on_plot=job["params"]["acc_lumi_additional_label_on_plot"],
     )
-    acc_lumi.plot_acc_lumi_by_day()
-    acc_lumi.plot_acc_lumi_by_week()
+    plot_stage.add(acc_lumi, "plot_acc_lumi_by_day", "plot_acc_lumi_by_week")
     del acc_lumi
+
+    # Render all plots
+    plot_stage.render()
+
+
+def run_full_certification(job: dict, stage: str | None = None, era_index: str | None = None):
+    """
+    Without `stage` everything runs here, eras in parallel worker processes.
+
+    In HTCondor DAG mode the job runs once per `stage`: "prepare" partitions the data (saved
+    in the results directory) and writes the eras sub-DAG, "era" analyses the era `era_index`
+    and "summarize" builds the eras summary and global plots.
+
+    Parameters needed:
+    - class_name
+    - dataset_name
+    - cycles
+    - min_run
+    - max_run
+    - ignore_runs
+    - ignore_hlt_emergency
+    - pre_json_oms_flags
+    - golden_json_oms_flags
+    - golden_json_rr_flags
+    - muon_json_oms_flags
+    - muon_json_rr_flags
+    - bril_brilws_version
+    - bril_unit
+    - bril_low_lumi_thr
+    - bril_beamstatus
+    - bril_amodetag
+    - bril_normtag
+    - eras_prefix
+    - ignore_eras
+    - lumiloss_dcs_flags
+    - lumiloss_subsystems_flags
+    - lumiloss_subdetectors_flags
+    - target_lumiloss_unit
+    - acc_lumi_year
+    - acc_lumi_beam_energy
+    - acc_lumi_additional_label_on_plot
+    """
+    dag_data_path = os.path.join(job["results_dir"], DAG_DATA_DIR)
+
+    if stage is None:
+        era_tasks, summary = prepare_eras(job)
+
+        # Analyse lumiloss and generate plots of all eras in parallel, statistics are returned in era order
+        # (plots of each era are rendered in the era process itself when eras already run in parallel)
+        workers = resolve_workers(job.get("workers"), memory_per_worker=ERA_WORKER_MEMORY)
+        for era_task in era_tasks:
+            era_task["plot_workers"] = 1 if workers > 1 else job.get("workers")
+        eras_statistics = run_in_pool(analyze_era, era_tasks, workers)
+        del era_tasks
+
+        summarize_eras(job, summary, eras_statistics)
+    elif stage == "prepare":
+        era_tasks, summary = prepare_eras(job)
+        os.makedirs(os.path.join(dag_data_path, "eras"), exist_ok=True)
+        for idx, era_task in enumerate(era_tasks):
+            with open(os.path.join(dag_data_path, "eras", f"{idx}.pkl"), "wb") as f:
+                pickle.dump(era_task, f)
+        with open(os.path.join(dag_data_path, "summary.pkl"), "wb") as f:
+            pickle.dump({**summary, "n_eras": len(era_tasks)}, f)
+
+        # Written in the job sandbox, HTCondor transfers it back next to the main DAG file
+        with open(ERAS_DAG_FNAME, "w") as f:
+            f.write(create_eras_dag(len(era_tasks)))
+    elif stage == "era":
+        with open(os.path.join(dag_data_path, "eras", f"{era_index}.pkl"), "rb") as f:
+            era_task = pickle.load(f)  # noqa: S301
+        era_task["plot_workers"] = job.get("workers")
+        era_statistics = analyze_era(**era_task)
+        write_json(os.path.join(dag_data_path, "eras", f"{era_index}.json"), era_statistics)
+    elif stage == "summarize":
+        with open(os.path.join(dag_data_path, "summary.pkl"), "rb") as f:
+            summary = pickle.load(f)  # noqa: S301
+        eras_statistics = []
+        for idx in range(summary.pop("n_eras")):
+            with open(os.path.join(dag_data_path, "eras", f"{idx}.json")) as f:
+                eras_statistics.append(json.load(f))
+        summarize_eras(job, summary, eras_statistics)
+        shutil.rmtree(dag_data_path)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
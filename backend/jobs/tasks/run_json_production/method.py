@@ -1,9 +1,11 @@
-import json
 import os
 
 import matplotlib
-from libdc3.methods.json_producer import JsonProducer
 from libdc3.methods.rr_actions import RunRegistryActions
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumisections.columnar import LumisectionTable
+from utils.lumisections.json_producer import MultiJsonProducer, json_profiles
+from utils.results.writer import STORE_PLAIN, write_cms_json
 
 
 matplotlib.use("Agg")
@@ -24,26 +26,21 @@ def run_json_production(job: dict):
     """
     # Fetch RR and OMS lumisection flags/bits
     rra = RunRegistryActions(class_name=job["params"]["class_name"], dataset_name=job["params"]["dataset_name"])
-    offline_lumis = rra.multi_fetch_rr_oms_joint_lumis(run_list=job["params"]["run_list"])
-    del rra
+    rrc = RunRegistryLumisCache(rra, cache_dir=job.get("cache_dir"))
+    offline_lumis = LumisectionTable.from_records(
+        rrc.multi_fetch_rr_oms_joint_lumis(run_list=job["params"]["run_list"])
+    )
+    del rra, rrc
 
     # Genrate all jsons
-    producer = JsonProducer(rr_oms_lumis=offline_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
-    pre_json = producer.generate(oms_flags=job["params"]["pre_json_oms_flags"])
-    golden_json = producer.generate(
-        oms_flags=job["params"]["golden_json_oms_flags"], rr_flags=job["params"]["golden_json_rr_flags"]
-    )
-    muon_json = producer.generate(
-        oms_flags=job["params"]["muon_json_oms_flags"], rr_flags=job["params"]["muon_json_rr_flags"]
-    )
+    producer = MultiJsonProducer(rr_oms_lumis=offline_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
+    jsons = producer.generate(json_profiles(job["params"]))
     del producer, offline_lumis
 
     # Save JSONs
+    results_storage = job.get("results_storage", STORE_PLAIN)
     base_path = os.path.join(job["results_dir"], "jsons")
     os.makedirs(base_path, exist_ok=True)
-    with open(os.path.join(base_path, "pre.json"), "w") as f:
-        json.dump(pre_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "golden.json"), "w") as f:
-        json.dump(golden_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "muon.json"), "w") as f:
-        json.dump(muon_json, f, ensure_ascii=False, indent=4)
+    for name, compact_json in jsons.items():
+        write_cms_json(os.path.join(base_path, f"{name}.json"), compact_json, storage=results_storage)
+    del jsons
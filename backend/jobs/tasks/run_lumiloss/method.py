@@ -1,12 +1,18 @@
-import json
 import os
 
 import matplotlib
 from libdc3.methods.bril_actions import BrilActions
-from libdc3.methods.json_producer import JsonProducer
 from libdc3.methods.lumiloss_analyzer import LumilossAnalyzer
 from libdc3.methods.lumiloss_plotter import LumilossPlotter
 from libdc3.methods.rr_actions import RunRegistryActions
+from utils.lumicache.bril import BrilLumisCache
+from utils.lumicache.rr_oms import RunRegistryLumisCache
+from utils.lumiplots.lazy import save_lumiloss_manifest
+from utils.lumisections.columnar import LumisectionTable
+from utils.lumisections.json_producer import MultiJsonProducer, json_profiles
+from utils.lumisections.run_selection import RunSelection
+from utils.parallel.plots import PlotStage
+from utils.results.writer import STORE_PLAIN, write_cms_json, write_json, write_text
 
 
 matplotlib.use("Agg")
@@ -47,33 +53,27 @@ def run_lumiloss(job: dict):
 
     # Fetch RR and OMS lumisection flags/bits
     rra = RunRegistryActions(class_name=job["params"]["class_name"], dataset_name=job["params"]["dataset_name"])
-    offline_lumis = rra.multi_fetch_rr_oms_joint_lumis(run_list=run_list)
-    del rra
+    rrc = RunRegistryLumisCache(rra, cache_dir=job.get("cache_dir"))
+    offline_lumis = LumisectionTable.from_records(rrc.multi_fetch_rr_oms_joint_lumis(run_list=run_list))
+    del rra, rrc
 
     # Genrate all jsons
-    elegible_runs = [*job["params"]["included_runs"], *job["params"]["not_in_dcs_runs"]]
-    elegible_lumis = [lumi for lumi in offline_lumis if lumi["run_number"] in elegible_runs]
-    producer = JsonProducer(rr_oms_lumis=elegible_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"])
-    pre_json = producer.generate(oms_flags=job["params"]["pre_json_oms_flags"])
-    golden_json = producer.generate(
-        oms_flags=job["params"]["golden_json_oms_flags"], rr_flags=job["params"]["golden_json_rr_flags"]
-    )
-    muon_json = producer.generate(
-        oms_flags=job["params"]["muon_json_oms_flags"], rr_flags=job["params"]["muon_json_rr_flags"]
+    elegible_runs = RunSelection(job["params"]["included_runs"], job["params"]["not_in_dcs_runs"])
+    elegible_lumis = offline_lumis.filter_runs(elegible_runs)
+    producer = MultiJsonProducer(
+        rr_oms_lumis=elegible_lumis, ignore_hlt_emergency=job["params"]["ignore_hlt_emergency"]
     )
+    jsons = producer.generate(json_profiles(job["params"]))
     del producer, elegible_runs, elegible_lumis
 
     # Save JSONs
+    results_storage = job.get("results_storage", STORE_PLAIN)
     base_path = os.path.join(job["results_dir"], "jsons")
     os.makedirs(base_path, exist_ok=True)
-    with open(os.path.join(base_path, "pre.json"), "w") as f:
-        json.dump(pre_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "golden.json"), "w") as f:
-        json.dump(golden_json, f, ensure_ascii=False, indent=4)
-    with open(os.path.join(base_path, "muon.json"), "w") as f:
-        json.dump(muon_json, f, ensure_ascii=False, indent=4)
-
-    del muon_json
+    for name, compact_json in jsons.items():
+        write_cms_json(os.path.join(base_path, f"{name}.json"), compact_json, storage=results_storage)
+    pre_json, golden_json = jsons["pre"], jsons["golden"]
+    del jsons
 
     # Fetch BRIL lumisections
     min_run = min(run_list)
@@ -86,19 +86,19 @@ def run_lumiloss(job: dict):
         amodetag=job["params"]["bril_amodetag"],
         normtag=job["params"]["bril_normtag"],
     )
-    bril_lumis = ba.fetch_lumis(begin=min_run, end=max_run).get("detailed")
-    bril_lumis = [lumi for lumi in bril_lumis if lumi["run_number"] in run_list]
+    bc = BrilLumisCache(ba, cache_dir=job.get("cache_dir"))
     used_keys = ["run_number", "ls_number", "delivered", "recorded", "datetime"]
-    bril_lumis = [{key: value for key, value in item.items() if key in used_keys} for item in bril_lumis]
+    bril_lumis = LumisectionTable.from_records(bc.fetch_lumis(begin=min_run, end=max_run).get("detailed"), used_keys)
+    bril_lumis = bril_lumis.filter_runs(run_list).to_records()
 
     # Compute lumiloss
     lumiloss = LumilossAnalyzer(
-        rr_oms_lumis=offline_lumis,
+        rr_oms_lumis=offline_lumis.to_records(),
         bril_lumis=bril_lumis,
         pre_json=pre_json,
         dc_json=golden_json,
-        low_lumi_runs=job["params"]["low_lumi_runs"],
-        ignore_runs=job["params"]["ignore_runs"],
+        low_lumi_runs=RunSelection(job["params"]["low_lumi_runs"]),
+        ignore_runs=RunSelection(job["params"]["ignore_runs"]),
         bril_unit=job["params"]["bril_unit"],
         target_unit=job["params"]["target_lumiloss_unit"],
     )
@@ -115,27 +115,38 @@ def run_lumiloss(job: dict):
     lumiloss_data_path = os.path.join(job["results_dir"], "lumiloss/data")
     os.makedirs(lumiloss_data_path, exist_ok=True)
     for key, value in lumiloss_results.items():
-        fpath = os.path.join(lumiloss_data_path, f"{key}.json")
-        with open(fpath, "w") as f:
-            json.dump(value, f)
-    with open(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), "w") as f:
-        f.write(txt_inclusive)
-    with open(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), "w") as f:
-        f.write(txt_exclusive)
+        write_json(os.path.join(lumiloss_data_path, f"{key}.json"), value, storage=results_storage)
+    write_text(os.path.join(lumiloss_data_path, "inclusive_loss_by_run.txt"), txt_inclusive, storage=results_storage)
+    write_text(os.path.join(lumiloss_data_path, "exclusive_loss_by_run.txt"), txt_exclusive, storage=results_storage)
     del txt_inclusive, txt_exclusive
 
+    plot_stage = PlotStage(workers=job.get("workers"))
+
     # Generate lumiloss plots
     lumiloss_plots_path = os.path.join(job["results_dir"], "lumiloss/plots")
     os.makedirs(lumiloss_plots_path, exist_ok=True)
-    plots = LumilossPlotter(
-        lumiloss=lumiloss_results, unit=job["params"]["target_lumiloss_unit"], output_path=lumiloss_plots_path
-    )
-    plots.plot_subsystem_dqmflag_loss()
-    plots.plot_dcs_loss()
-    plots.plot_cms_inclusive_loss()
-    plots.plot_cms_exclusive_loss()
-    plots.plot_cms_detailed_fraction_exclusive_loss()
-    plots.plot_inclusive_loss_by_subdetector()
-    plots.plot_exclusive_loss_by_subdetector()
-    plots.plot_fraction_of_exclusive_loss_by_subdetector()
-    del lumiloss_plots_path, plots
+    if job.get("lazy_plots"):
+        # Only register the plots, the files API renders them when first requested
+        save_lumiloss_manifest(
+            lumiloss_plots_path, lumiloss_data_path, job["params"]["target_lumiloss_unit"], lumiloss_results
+        )
+    else:
+        plots = LumilossPlotter(
+            lumiloss=lumiloss_results, unit=job["params"]["target_lumiloss_unit"], output_path=lumiloss_plots_path
+        )
+        plot_stage.add(
+            plots,
+            "plot_subsystem_dqmflag_loss",
+            "plot_dcs_loss",
+            "plot_cms_inclusive_loss",
+            "plot_cms_exclusive_loss",
+            "plot_cms_detailed_fraction_exclusive_loss",
+            "plot_inclusive_loss_by_subdetector",
+            "plot_exclusive_loss_by_subdetector",
+            "plot_fraction_of_exclusive_loss_by_subdetector",
+        )
+        del plots
+    del lumiloss_plots_path
+
+    # Render all plots
+    plot_stage.render()
@@ -4,10 +4,18 @@ import traceback
 
 from celery import shared_task
 from django.conf import settings
+from django.utils import timezone
+from utils.file_serving.listing import invalidate_listings
 from utils.htcondor.htcondor import HTCondorExecutor
-from utils.htcondor.utils import create_python_script, create_shell_script, create_submit_file
+from utils.htcondor.utils import (
+    create_python_script,
+    create_shell_script,
+    create_submit_file,
+    list_local_modules_in_src,
+)
 
 from ...models import Job, JobStatus
+from ...resources import size_htcondor_job
 from ...serializers import JobSerializer
 from . import method
 
@@ -17,17 +25,24 @@ def run_lumiloss_task(job_id):
     try:
         job = Job.objects.get(pk=job_id)
         job.status = JobStatus.STARTED
+        job.started_at = timezone.now()
         job.save()
         job_input = JobSerializer(job).data
+        job_input["cache_dir"] = settings.LUMI_CACHE_DIR
+        job_input["results_storage"] = settings.RESULTS_STORAGE
+        job_input["workers"] = settings.LOCAL_JOB_WORKERS
+        job_input["lazy_plots"] = settings.LAZY_PLOTS
         method.run_lumiloss(job_input)
     except Exception as err:
         job.status = JobStatus.FAILURE
         job.traceback = traceback.format_exc()
         job.save()
+        invalidate_listings(job.results_dir)
         raise err
     else:
         job.status = JobStatus.SUCCESS
         job.save()
+        invalidate_listings(job.results_dir)
 
 
 @shared_task
@@ -35,6 +50,7 @@ def run_lumiloss_htcondor_task(job_id):
     try:
         job = Job.objects.get(pk=job_id)
         job.status = JobStatus.STARTED
+        job.started_at = timezone.now()
         job.save()
         job_input = JobSerializer(job).data
 
@@ -42,53 +58,52 @@ def run_lumiloss_htcondor_task(job_id):
         remote_work_path = f"{settings.BASE_CONDOR_WORK_DIR}/jobs/{job_id}"
         remote_results_dir = f"{settings.BASE_CONDOR_RESULTS_DIR}/jobs/{job_id}"
 
+        # Size the requests from the resources used by the previous jobs of the same action
+        resources = size_htcondor_job(job.action, job.routing.get("estimated_lumis"), settings.CONDOR_JOB_WORKERS)
+        job.routing["resources"] = resources
+
         # Prepare HTCondor files
         src = inspect.getsource(method)
+        local_modules = list_local_modules_in_src(src, settings.BASE_DIR)
         sub = create_submit_file(
-            request_cpus=1,
-            request_disk=252000,
-            request_memory=10240,
+            **resources,
             environment={
                 "CERT_FPATH": settings.CONDOR_CERT_FPATH,
                 "KEY_FPATH": settings.CONDOR_KEY_FPATH,
                 "SSO_CLIENT_ID": settings.RR_SSO_CLIENT_ID,
                 "SSO_CLIENT_SECRET": settings.RR_SSO_CLIENT_SECRET,
             },
+            transfer_input_files=sorted({fpath.split("/")[0] for fpath in local_modules}),
         )
-        sh = create_shell_script(src)
+        sh = create_shell_script(src, settings.BASE_DIR, local_modules, env_dir=settings.BASE_CONDOR_ENV_DIR)
         py = create_python_script(src, method.run_lumiloss.__name__)
         job_input["results_dir"] = remote_results_dir
+        job_input["cache_dir"] = settings.BASE_CONDOR_CACHE_DIR
+        job_input["results_storage"] = settings.RESULTS_STORAGE
+        job_input["workers"] = resources["request_cpus"]
+        job_input["lazy_plots"] = settings.LAZY_PLOTS
         job_input = json.dumps({"job": job_input})
 
         with HTCondorExecutor(settings.KEYTAB_USR, settings.KEYTAB_PWD) as htcondor:
-            htcondor.mkdir(remote_work_path)
-            htcondor.mkdir(remote_results_dir)
-            htcondor.put_str_as_file(sub, f"{remote_work_path}/main.sub")
-            htcondor.put_str_as_file(sh, f"{remote_work_path}/main.sh")
-            htcondor.put_str_as_file(py, f"{remote_work_path}/main.py")
-            htcondor.put_str_as_file(job_input, f"{remote_work_path}/input.json")
-            htcondor.chmod_x(f"{remote_work_path}/main.sh")
+            htcondor.stage_bundle(
+                remote_work_path,
+                files={"main.sub": sub, "main.sh": sh, "main.py": py, "input.json": job_input},
+                local_dir=settings.BASE_DIR,
+                local_fpaths=local_modules,
+                executables=["main.sh"],
+                extra_dirs=[remote_results_dir],
+            )
             schedd, _, _ = htcondor.myschedd_bump()
             condor_id = htcondor.condor_submit(remote_work_path, "main.sub")
 
-            has_err = None
-            try:
-                htcondor.wait_job(schedd, condor_id)
-            except Exception as err:  # noqa: BLE001
-                has_err = err
-            finally:
-                eos_history_path = f"{remote_results_dir}/htcondor"
-                htcondor.mkdir(eos_history_path)
-                htcondor.mv(f"{remote_work_path}/*", eos_history_path)
-                htcondor.rm(remote_work_path, recursive=True)
-
-            if has_err:
-                raise has_err
+        # The job is finalized by track_htcondor_jobs_task once HTCondor is done with it
+        job.condor_schedd = schedd
+        job.condor_cluster_id = condor_id
+        job.condor_work_dir = remote_work_path
+        job.condor_results_dir = remote_results_dir
+        job.save()
     except Exception as err:
         job.status = JobStatus.FAILURE
         job.traceback = traceback.format_exc()
         job.save()
         raise err
-    else:
-        job.status = JobStatus.SUCCESS
-        job.save()
@@ -0,0 +1,124 @@
+import logging
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from utils.file_serving.listing import invalidate_listings
+from utils.htcondor.exceptions import CondorJobFailedError, CondorJobNotFoundError
+from utils.htcondor.htcondor import HTCondorExecutor
+
+from ...models import Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_STATUSES = ("IDLE", "RUNNING", "TRANSFERRING_OUTPUT")
+RESOURCE_USAGE_ATTRIBUTES = ("MemoryUsage", "DiskUsage", "RemoteWallClockTime")
+SYNC_MAX_RETRIES = 5
+
+
+def user_log_fpath(job: Job) -> str:
+    # DAGMan logs the events of the DAG job next to the DAG file
+    if job.routing.get("dag"):
+        return f"{job.condor_work_dir}/main.dag.dagman.log"
+    return f"{job.condor_work_dir}/{job.condor_cluster_id}.log"
+
+
+def finalize_htcondor_job(htcondor: HTCondorExecutor, job: Job, status: dict):
+    # Peak usage of the job, used to size the next requests of the same action
+    job.resource_usage = {key: status[key] for key in RESOURCE_USAGE_ATTRIBUTES if status.get(key) is not None}
+    try:
+        htcondor.raise_for_status(job.condor_schedd or None, job.condor_cluster_id, status["JobStatus"])
+        # Checks every job of the work directory, so DAG nodes failures are reported as well
+        htcondor.check_work_dir_stderr(job.condor_work_dir)
+        if status.get("ExitCode"):
+            raise CondorJobFailedError(f"HTCondor job exited with code {status['ExitCode']}")
+    except Exception:  # noqa: BLE001
+        job.traceback = traceback.format_exc()
+    finally:
+        htcondor.archive_work_dir(job.condor_work_dir, f"{job.condor_results_dir}/htcondor")
+    # The job only succeeds or fails once its results are local, the HTCondor verdict is kept in the traceback
+    job.status = JobStatus.SYNCING
+    job.save()
+    sync_htcondor_results_task.delay(str(job.id))
+
+
+def fail_missing_htcondor_job(job: Job):
+    err = CondorJobNotFoundError(
+        f"HTCondor job {job.condor_cluster_id} is in neither condor_q, condor_history nor its user log"
+    )
+    job.status = JobStatus.FAILURE
+    job.traceback = "".join(traceback.format_exception_only(err))
+    job.save()
+
+
+@shared_task(bind=True, max_retries=SYNC_MAX_RETRIES)
+def sync_htcondor_results_task(self, job_id):
+    """
+    Copy the results of a finished HTCondor job into its local results directory, so they are served by the API
+
+    Only new or changed files are transferred, a retry resumes where the previous attempt stopped.
+    The job is SYNCING meanwhile, and gets the verdict of HTCondor (FAILURE when finalize_htcondor_job
+    recorded a traceback) once the results are complete.
+    """
+    job = Job.objects.get(pk=job_id)
+    try:
+        with HTCondorExecutor(settings.KEYTAB_USR, settings.KEYTAB_PWD) as htcondor:
+            stats = htcondor.sync_dir(job.condor_results_dir, job.results_dir, streams=settings.CONDOR_SYNC_STREAMS)
+    except Exception as err:
+        if self.request.retries >= self.max_retries:
+            job.status = JobStatus.FAILURE
+            job.traceback += traceback.format_exc()
+            job.save()
+            invalidate_listings(job.results_dir)
+            raise err
+        raise self.retry(exc=err, countdown=60 * 2**self.request.retries) from err
+
+    logger.info("Synced results of %s: %s", job, stats)
+    job.status = JobStatus.FAILURE if job.traceback else JobStatus.SUCCESS
+    job.save()
+    invalidate_listings(job.results_dir)
+
+
+@shared_task
+def track_htcondor_jobs_task():
+    """
+    Finalize every submitted HTCondor job that is done, reading the user
+    logs of all of them in a single round trip per schedd (the schedd is
+    only queried for jobs without a log event yet)
+
+    Jobs that HTCondor doesn't know about (lost schedd, rotated history and
+    removed user log) fail once they were started more than
+    HTCONDOR_TRACKER_MISSING_TIMEOUT seconds ago.
+    """
+    missing_deadline = timezone.now() - timedelta(seconds=settings.HTCONDOR_TRACKER_MISSING_TIMEOUT)
+    jobs = defaultdict(list)
+    for job in Job.objects.filter(status=JobStatus.STARTED, condor_cluster_id__isnull=False):
+        jobs[job.condor_schedd].append(job)
+    if len(jobs) == 0:
+        return
+
+    with HTCondorExecutor(settings.KEYTAB_USR, settings.KEYTAB_PWD) as htcondor:
+        for schedd, schedd_jobs in jobs.items():
+            cluster_ids = [job.condor_cluster_id for job in schedd_jobs]
+            log_fpaths = {job.condor_cluster_id: user_log_fpath(job) for job in schedd_jobs}
+            statuses = htcondor.jobs_status(schedd or None, cluster_ids, log_fpaths)
+            for job in schedd_jobs:
+                status = statuses.get(job.condor_cluster_id)
+                if status is None and job.started_at is not None and job.started_at < missing_deadline:
+                    logger.warning("HTCondor job %s of %s not found, failing it", job.condor_cluster_id, job)
+                    fail_missing_htcondor_job(job)
+                    continue
+                if status is None or status["JobStatus"] in IN_FLIGHT_STATUSES:
+                    continue
+                # Ticks may overlap on a worker with several processes, the other one finalized it already
+                if not Job.objects.filter(pk=job.pk, status=JobStatus.STARTED).exists():
+                    continue
+                logger.info("HTCondor job %s of %s is %s", job.condor_cluster_id, job, status["JobStatus"])
+                try:
+                    finalize_htcondor_job(htcondor, job, status)
+                except Exception:
+                    logger.exception("Failed to finalize %s", job)
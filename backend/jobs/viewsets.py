@@ -15,7 +15,8 @@ from utils.rest_framework_cern_sso.authentication import (
 )
 
 from .filters import JobFilter
-from .models import Job
+from .models import Job, JobBackend
+from .routing import DEFAULT_LUMIS_PER_RUN, DEFAULT_RUNS_PER_CYCLE, estimate_lumis, route_job
 from .serializers import JobSerializer
 from .tasks import (
     run_acc_lumi_htcondor_task,
@@ -53,7 +54,15 @@ class JobsViewSet(
         username = self.request.user.username if has_user else None
         return username if username else settings.UNAUTHENTICATED_USER
 
-    def __schedule_generic_task(self, task_function, task_input):
+    def __schedule_routed_task(self, local_task, htcondor_task, task_input, n_lumis, n_cached_runs=0):
+        routing = route_job(local_task.__name__, htcondor_task.__name__, n_lumis, n_cached_runs)
+        task_function = local_task if routing["backend"] == JobBackend.LOCAL else htcondor_task
+        return self.__schedule_generic_task(task_function=task_function, task_input=task_input, routing=routing)
+
+    def __estimate_lumis(self, task_input, run_list):
+        return estimate_lumis(task_input.get("class_name"), task_input.get("dataset_name"), run_list)
+
+    def __schedule_generic_task(self, task_function, task_input, routing=None):
         job_id = str(uuid.uuid4())
         job_name = task_input.pop("job_name")
         results_dir = os.path.join(settings.BASE_LOCAL_RESULTS_DIR, "jobs", job_id)
@@ -67,6 +76,8 @@ class JobsViewSet(
             params=task_input,
             created_by=self.current_user(),
             results_dir=results_dir,
+            backend=routing["backend"] if routing else "",
+            routing=routing or {},
         )
 
         # Schedule task
@@ -79,9 +90,10 @@ class JobsViewSet(
         if not request.data.get("run_list"):
             raise HttpResponseBadRequest("cycles or min_run/max_run should be specified.")
 
-        run_list = request.data.get("run_list")
-        task_function = run_json_production_htcondor_task if len(run_list) > 150 else run_json_production_task
-        task = self.__schedule_generic_task(task_function=task_function, task_input=request.data)
+        n_lumis, n_cached_runs = self.__estimate_lumis(request.data, request.data.get("run_list"))
+        task = self.__schedule_routed_task(
+            run_json_production_task, run_json_production_htcondor_task, request.data, n_lumis, n_cached_runs
+        )
         return Response({"task_id": task.id, "status": task.status})
 
     @action(detail=False, methods=["POST"], url_path=r"run-lumiloss")
@@ -94,8 +106,10 @@ class JobsViewSet(
             raise HttpResponseBadRequest("included_runs should be specified.")
 
         all_runs = [*included_runs, *not_in_dcs_runs, *low_lumi_runs, *ignore_runs]
-        task_function = run_lumiloss_htcondor_task if len(all_runs) > 150 else run_lumiloss_task
-        task = self.__schedule_generic_task(task_function=task_function, task_input=request.data)
+        n_lumis, n_cached_runs = self.__estimate_lumis(request.data, all_runs)
+        task = self.__schedule_routed_task(
+            run_lumiloss_task, run_lumiloss_htcondor_task, request.data, n_lumis, n_cached_runs
+        )
         return Response({"task_id": task.id, "status": task.status})
 
     @action(detail=False, methods=["POST"], url_path=r"run-full-lumi-analysis")
@@ -108,8 +122,10 @@ class JobsViewSet(
             raise HttpResponseBadRequest("included_runs should be specified.")
 
         all_runs = [*included_runs, *not_in_dcs_runs, *low_lumi_runs, *ignore_runs]
-        task_function = run_full_lumi_analysis_htcondor_task if len(all_runs) > 150 else run_full_lumi_analysis_task
-        task = self.__schedule_generic_task(task_function=task_function, task_input=request.data)
+        n_lumis, n_cached_runs = self.__estimate_lumis(request.data, all_runs)
+        task = self.__schedule_routed_task(
+            run_full_lumi_analysis_task, run_full_lumi_analysis_htcondor_task, request.data, n_lumis, n_cached_runs
+        )
         return Response({"task_id": task.id, "status": task.status})
 
     @action(detail=False, methods=["POST"], url_path=r"run-acc-lumi")
@@ -117,21 +133,26 @@ class JobsViewSet(
         if not request.data.get("run_list"):
             raise HttpResponseBadRequest("cycles or min_run/max_run should be specified.")
 
-        run_list = request.data.get("run_list")
-        task_function = run_acc_lumi_htcondor_task if len(run_list) > 150 else run_acc_lumi_task
-        task = self.__schedule_generic_task(task_function=task_function, task_input=request.data)
+        n_lumis, n_cached_runs = self.__estimate_lumis(request.data, request.data.get("run_list"))
+        task = self.__schedule_routed_task(
+            run_acc_lumi_task, run_acc_lumi_htcondor_task, request.data, n_lumis, n_cached_runs
+        )
         return Response({"task_id": task.id, "status": task.status})
 
     @action(detail=False, methods=["POST"], url_path=r"run-full-certification")
     def run_full_certification(self, request, pk=None):
+        # The runs are only known once the job fetched them, estimate from the cycles or the run interval
         if request.data.get("cycles"):
-            cycles = request.data.get("cycles")
-            task_function = run_full_certification_htcondor_task if len(cycles) > 10 else run_full_certification_task
+            n_runs = len(request.data.get("cycles")) * DEFAULT_RUNS_PER_CYCLE
         elif request.data.get("min_run") and request.data.get("max_run"):
-            n_runs_max = request.data.get("max_run") - request.data.get("min_run")
-            task_function = run_full_certification_htcondor_task if n_runs_max > 150 else run_full_certification_task
+            n_runs = request.data.get("max_run") - request.data.get("min_run")
         else:
             raise HttpResponseBadRequest("cycles or min_run/max_run should be specified.")
 
-        task = self.__schedule_generic_task(task_function=task_function, task_input=request.data)
+        task = self.__schedule_routed_task(
+            run_full_certification_task,
+            run_full_certification_htcondor_task,
+            request.data,
+            n_runs * DEFAULT_LUMIS_PER_RUN,
+        )
         return Response({"task_id": task.id, "status": task.status})
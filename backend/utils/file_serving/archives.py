@@ -0,0 +1,155 @@
+import fnmatch
+import gzip
+import io
+import os
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+from ..lumiplots.lazy import list_lazy_plots, render_lazy_plot
+from ..results.writer import GZIP_EXTENSION
+from .responses import CHUNK_SIZE
+
+
+# Already compressed files are stored as is in ZIP archives
+STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", GZIP_EXTENSION)
+# Files still being transferred by the HTCondor results sync
+PARTIAL_EXTENSION = ".part"
+
+
+@dataclass
+class ArchiveEntry:
+    fpath: str
+    arcname: str
+    size: int
+    mtime: float
+    gzipped: bool = False  # Only the .gz copy is stored, the entry is its decompressed content
+
+    def open(self) -> io.BufferedIOBase:
+        return gzip.open(self.fpath, "rb") if self.gzipped else open(self.fpath, "rb")
+
+    def chunks(self) -> Iterator[bytes]:
+        with self.open() as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+
+def gzip_uncompressed_size(fpath: str) -> int:
+    # ISIZE, the last 4 bytes of a (single member, < 4 GiB) gzip file
+    with open(fpath, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack("<I", f.read(4))[0]
+
+
+def list_archive_entries(dir_path: str, base_dir: str, pattern: str | None = None) -> list[ArchiveEntry]:
+    """
+    Files under `dir_path` whose relative path matches `pattern` (fnmatch, `*` also matches `/`)
+
+    Plots registered for on demand rendering are rendered first, so archives hold every plot of
+    the directory listings. Hidden entries (lazy plots manifest and render directories, temporary
+    files) and partially synced files are skipped, compressed results are listed under their plain
+    name, like in directory listings.
+    """
+    for file_path in list_lazy_plots(dir_path, base_dir):
+        if not pattern or fnmatch.fnmatch(os.path.relpath(file_path, dir_path), pattern):
+            render_lazy_plot(file_path, base_dir)
+
+    entries = []
+    for root, dirnames, fnames in os.walk(dir_path):
+        dirnames[:] = sorted(dirname for dirname in dirnames if not dirname.startswith("."))
+        fnames = [fname for fname in fnames if not fname.startswith(".") and not fname.endswith(PARTIAL_EXTENSION)]
+        for fname in sorted(fnames):
+            fpath = os.path.join(root, fname)
+            gzipped = fname.endswith(GZIP_EXTENSION) and fname.removesuffix(GZIP_EXTENSION) not in fnames
+            if fname.endswith(GZIP_EXTENSION) and not gzipped:
+                continue
+            arcname = os.path.relpath(fpath, dir_path).removesuffix(GZIP_EXTENSION if gzipped else "")
+            if pattern and not fnmatch.fnmatch(arcname, pattern):
+                continue
+            stat = os.stat(fpath)
+            size = gzip_uncompressed_size(fpath) if gzipped else stat.st_size
+            entries.append(ArchiveEntry(fpath, arcname, size, stat.st_mtime, gzipped))
+
+    return entries
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Unseekable output collecting what is written until it is drained
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    ZIP archive of `entries`, produced chunk by chunk without holding more than a chunk in memory
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.arcname, date_time=time.localtime(entry.mtime)[:6])
+            info.file_size = entry.size
+            info.external_attr = 0o644 << 16
+            stored = entry.arcname.lower().endswith(STORED_EXTENSIONS)
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with zf.open(info, "w") as dst:
+                for chunk in entry.chunks():
+                    dst.write(chunk)
+                    if len(sink.buffer) >= CHUNK_SIZE:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_tar_gz(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    tar.gz archive of `entries`, produced chunk by chunk without holding more than a chunk in memory
+    """
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    offset = 0
+
+    def write(data: bytes) -> bytes:
+        nonlocal offset
+        offset += len(data)
+        return compressor.compress(data)
+
+    for entry in entries:
+        info = tarfile.TarInfo(entry.arcname)
+        info.size = entry.size
+        info.mtime = int(entry.mtime)
+        info.mode = 0o644
+        yield write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        written = 0
+        for chunk in entry.chunks():
+            # The header announced `size` bytes, a file growing meanwhile must not corrupt the archive
+            chunk = chunk[: entry.size - written]
+            written += len(chunk)
+            yield write(chunk)
+        yield write(b"\0" * (entry.size - written + (-entry.size) % tarfile.BLOCKSIZE))
+
+    # End of archive: two empty blocks, padded to a full record
+    yield write(b"\0" * (2 * tarfile.BLOCKSIZE))
+    yield write(b"\0" * ((-offset) % tarfile.RECORDSIZE))
+    yield compressor.flush()
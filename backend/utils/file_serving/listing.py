@@ -0,0 +1,120 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from ..lumiplots.lazy import list_lazy_entries
+from ..results.writer import GZIP_EXTENSION
+
+
+def dir_mtime(dir_path: str) -> int | None:
+    try:
+        return os.stat(dir_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def invalidate_listings(dir_path: str):
+    """
+    Make every cached listing of `dir_path` and its subdirectories stale, in all processes
+
+    Files rewritten in place (plots overwritten, growing logs) do not update their directory, this
+    is called once a job is done writing its results.
+    """
+    for root, _, _ in os.walk(dir_path):
+        try:
+            os.utime(root)
+        except FileNotFoundError:
+            continue
+
+
+def scan_dir(dir_path: str, base_dir: str, recursive: bool, dir_mtimes: dict[str, int | None]) -> list[dict]:
+    """
+    Entries of `dir_path` (with their `children` if `recursive`) from a single scandir pass and one stat
+    per entry, recording the modification time of every scanned directory in `dir_mtimes`
+    """
+    # Plots registered for on demand rendering are listed even if they were never requested
+    files = []
+    for name, is_directory in list_lazy_entries(dir_path, base_dir).items():
+        entry = {"name": name, "is_directory": is_directory, "size": None, "last_modified": None}
+        if recursive and is_directory:
+            entry["children"] = scan_dir(os.path.join(dir_path, name), base_dir, recursive, dir_mtimes)
+        files.append(entry)
+
+    # Recorded before scanning, a change made meanwhile invalidates the listing
+    dir_mtimes[dir_path] = dir_mtime(dir_path)
+    if dir_mtimes[dir_path] is None:
+        return files
+    with os.scandir(dir_path) as it:
+        dir_entries = list(it)
+
+    names = {dir_entry.name for dir_entry in dir_entries}
+    for dir_entry in dir_entries:
+        # Hidden entries: lazy plots manifest and render directories, files still being written or synced
+        if dir_entry.name.startswith("."):
+            continue
+        entry_stat = dir_entry.stat()
+        is_directory = stat.S_ISDIR(entry_stat.st_mode)
+        # Compressed results are served under their plain name, next to the plain copy or instead of it
+        name = dir_entry.name
+        if name.endswith(GZIP_EXTENSION) and not is_directory:
+            name = name.removesuffix(GZIP_EXTENSION)
+            if name in names:
+                continue
+        entry = {
+            "name": name,
+            "is_directory": is_directory,
+            "size": None if is_directory else entry_stat.st_size,
+            "last_modified": datetime.fromtimestamp(entry_stat.st_mtime).isoformat(),
+        }
+        if recursive and is_directory:
+            entry["children"] = scan_dir(dir_entry.path, base_dir, recursive, dir_mtimes)
+        files.append(entry)
+
+    return files
+
+
+class DirectoryListingCache:
+    """
+    Directory listings kept between requests of the same process
+
+    A listing stays valid for MAX_AGE seconds as long as none of its directories was modified.
+    Creating, removing or renaming an entry (atomic result writes, the HTCondor results sync, a lazy
+    plot rendering) updates the directory modification time, whichever process did it, and finished
+    jobs invalidate their directories explicitly. Checking costs one stat per directory, not per file,
+    files rewritten in place while a job runs are picked up when the listing expires.
+    """
+
+    MAX_ENTRIES = 256
+    MAX_AGE = 30
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple[str, bool], tuple[float, dict[str, int | None], list[dict]]] = OrderedDict()
+
+    def get(self, dir_path: str, base_dir: str, recursive: bool = False) -> list[dict]:
+        key = (os.path.abspath(dir_path), recursive)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+        if cached is not None:
+            scanned_at, dir_mtimes, files = cached
+            fresh = time.monotonic() - scanned_at < self.MAX_AGE
+            if fresh and all(dir_mtime(path) == mtime for path, mtime in dir_mtimes.items()):
+                return files
+
+        scanned_at = time.monotonic()
+        dir_mtimes = {}
+        files = scan_dir(dir_path, base_dir, recursive, dir_mtimes)
+        with self.lock:
+            self.entries[key] = (scanned_at, dir_mtimes, files)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.MAX_ENTRIES:
+                self.entries.popitem(last=False)
+        return files
+
+
+listing_cache = DirectoryListingCache()
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from collections.abc import Iterator
+from typing import BinaryIO
+from urllib.parse import quote
+
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import content_disposition_header, http_date
+
+from ..results.writer import GZIP_EXTENSION
+
+
+CHUNK_SIZE = 64 * 1024
+RANGE_REGEX = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Results of finished jobs never change, clients may keep them without revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class RangeNotSatisfiableError(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    First and last byte of a single range `Range` header for a file of `size` bytes
+
+    Return None when the whole file should be served (malformed or multiple ranges, which are
+    allowed to be ignored), raise RangeNotSatisfiableError when the range is outside the file.
+    """
+    match = RANGE_REGEX.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        if end == "":
+            return None
+        suffix_length = int(end)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiableError()
+        return max(size - suffix_length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiableError()
+    return start, end
+
+
+def file_etag(stat: os.stat_result, variant: str = "") -> str:
+    # Every representation of a file (e.g. gzip encoded) needs its own tag
+    suffix = f"-{variant}" if variant else ""
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+
+
+def content_etag(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'  # noqa: S324
+
+
+def set_cache_headers(response: HttpResponse, etag: str, last_modified: float | None, immutable: bool = False):
+    """
+    Validators of the response, which is cached for a year when `immutable` and revalidated on every use otherwise
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # Results are only served to authenticated users, shared caches must not keep them
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+
+
+def not_modified_response(
+    request: HttpRequest, etag: str, last_modified: float | None, immutable: bool = False
+) -> HttpResponse | None:
+    """
+    304 (or 412) response when the request preconditions (If-None-Match, If-Modified-Since, ...) allow it
+    """
+    last_modified = int(last_modified) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_cache_headers(response, etag, last_modified, immutable)
+    return response
+
+
+def accepts_gzip(request: HttpRequest) -> bool:
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().removeprefix("q=")
+        try:
+            return float(quality) > 0 if quality else True
+        except ValueError:
+            return True
+    return False
+
+
+def iter_file(f: BinaryIO, start: int, length: int | None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Chunks of `length` bytes of `f` from `start`, up to the end of the file if `length` is None
+    """
+    try:
+        f.seek(start)
+        while length is None or length > 0:
+            chunk = f.read(chunk_size if length is None else min(chunk_size, length))
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(
+    request: HttpRequest,
+    file_path: str,
+    content_type: str | None = None,
+    as_attachment: bool = False,
+    accel_redirect_prefix: str = "",
+    immutable: bool = False,
+) -> HttpResponse:
+    """
+    Stream `file_path` in chunks, honouring conditional requests (304) and single `Range` requests (206)
+
+    When a precompressed `file_path.gz` exists, it is sent as is to clients accepting gzip, and
+    decompressed on the fly (without ranges) for the others if there is no plain copy.
+    With `accel_redirect_prefix`, the response only carries the headers and an `X-Accel-Redirect`
+    to `<prefix><absolute file path>` so the reverse proxy sends the file (and handles ranges
+    and encodings) itself.
+    """
+    filename = os.path.basename(file_path)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    source_path = file_path
+    variant = ""
+    has_gzip = os.path.isfile(file_path + GZIP_EXTENSION)
+    if has_gzip and accepts_gzip(request):
+        source_path, variant = file_path + GZIP_EXTENSION, "gzip"
+    elif has_gzip and not os.path.isfile(file_path):
+        source_path, variant = file_path + GZIP_EXTENSION, "gunzip"
+    stat = os.stat(source_path)
+    etag = file_etag(stat, variant)
+
+    def finalize(response: HttpResponse) -> HttpResponse:
+        set_cache_headers(response, etag, stat.st_mtime, immutable)
+        if has_gzip:
+            patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+    response = not_modified_response(request, etag, stat.st_mtime, immutable)
+    if response is not None:
+        return finalize(response)
+
+    if accel_redirect_prefix:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(accel_redirect_prefix + os.path.abspath(file_path))
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        return finalize(response)
+
+    if variant == "gunzip":
+        response = StreamingHttpResponse(iter_file(gzip.open(source_path, "rb"), 0, None), content_type=content_type)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        response["Accept-Ranges"] = "none"
+        return finalize(response)
+
+    # A range of another version of the file is useless, If-Range asks for the whole file then
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and if_range and if_range not in (etag, http_date(stat.st_mtime)):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, stat.st_size) if range_header else None
+    except RangeNotSatisfiableError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    f = open(source_path, "rb")
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type, as_attachment=as_attachment, filename=filename)
+        response.block_size = CHUNK_SIZE
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file(f, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+
+    if variant == "gzip":
+        response["Content-Encoding"] = "gzip"
+    response["Accept-Ranges"] = "bytes"
+    return finalize(response)
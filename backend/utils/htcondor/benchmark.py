@@ -0,0 +1,112 @@
+"""
+Benchmark the HTCondor job path (staging, submission and monitoring) against the local fake HTCondor
+
+Every job is staged and submitted like the htcondor tasks do, then followed with batched user log
+reads like track_htcondor_jobs_task (the schedd is only queried for jobs without a log event yet).
+
+Usage (from the backend directory):
+    python -m utils.htcondor.benchmark --jobs 50 --concurrency 8 --latency 0.05
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .fake import TERMINAL_STATUSES, FakeHTCondor
+from .htcondor import HTCondorExecutor
+from .utils import create_submit_file
+
+
+def submit_job(work_dir: str) -> tuple[str, int, float]:
+    start = time.perf_counter()
+    with HTCondorExecutor("fake", "fake") as htcondor:
+        htcondor.stage_bundle(
+            work_dir,
+            files={
+                "main.sub": create_submit_file(
+                    request_cpus=1, request_disk=100000, request_memory=2048, environment={}
+                ),
+                "main.sh": "#!/bin/sh\npython3 main.py\n",
+                "main.py": "print('fake')\n",
+                "input.json": "{}",
+            },
+            executables=["main.sh"],
+        )
+        schedd, _, _ = htcondor.myschedd_bump()
+        cluster_id = htcondor.condor_submit(work_dir, "main.sub")
+    return schedd, cluster_id, time.perf_counter() - start
+
+
+def monitor_tracker(schedd: str, jobs: list[tuple[int, str]], interval: float) -> dict[int, float]:
+    finished_at = {}
+    with HTCondorExecutor("fake", "fake") as htcondor:
+        while len(finished_at) < len(jobs):
+            pending = {cluster_id: f"{work_dir}/{cluster_id}.log" for cluster_id, work_dir in jobs}
+            pending = {cluster_id: fpath for cluster_id, fpath in pending.items() if cluster_id not in finished_at}
+            for cluster_id, status in htcondor.jobs_status(schedd, list(pending), pending).items():
+                if status["JobStatus"] in TERMINAL_STATUSES:
+                    finished_at[cluster_id] = time.time()
+            time.sleep(interval)
+    return finished_at
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every SSH command")
+    parser.add_argument("--schedd-latency", type=float, default=0.0, help="Seconds added to every HTCondor command")
+    parser.add_argument("--idle", type=float, default=2.0, help="Seconds every job stays idle")
+    parser.add_argument("--running", type=float, default=3.0, help="Seconds every job stays running")
+    parser.add_argument("--history-size", type=int, default=None, help="Finished jobs kept by condor_history")
+    parser.add_argument("--interval", type=int, default=1, help="Seconds between status queries")
+    parser.add_argument("--root-dir", default=None, help="Fake HTCondor directory, a temporary one by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = args.root_dir or tmp_dir
+        fake = FakeHTCondor(
+            root_dir,
+            transitions=[("IDLE", args.idle), ("RUNNING", args.running)],
+            latency=args.latency,
+            schedd_latency=args.schedd_latency,
+            history_size=args.history_size,
+        )
+        fake.install()
+
+        work_dirs = [os.path.join(root_dir, "jobs", str(index)) for index in range(args.jobs)]
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            submitted = list(executor.map(submit_job, work_dirs))
+        submit_time = time.monotonic() - start
+        submit_commands = fake.n_commands
+        submit_queries = fake.schedd_queries
+
+        schedd = submitted[0][0]
+        cluster_ids = [cluster_id for _, cluster_id, _ in submitted]
+        jobs = list(zip(cluster_ids, work_dirs, strict=True))
+        finished_at = monitor_tracker(schedd, jobs, args.interval)
+        total_time = time.monotonic() - start
+        expected_end = {cluster_id: job["finished_at"] for cluster_id, job in fake.jobs().items()}
+        monitor_queries = fake.schedd_queries - submit_queries
+        fake.uninstall()
+
+    latencies = [latency for _, _, latency in submitted]
+    detection_lags = [max(finished_at[cluster_id] - expected_end[cluster_id], 0.0) for cluster_id in cluster_ids]
+    print(f"jobs: {args.jobs}, concurrency: {args.concurrency}, ssh latency: {args.latency}s")
+    print(f"submission:       {submit_time:.2f}s ({args.jobs / submit_time:.1f} jobs/s, {submit_commands} commands)")
+    print(f"submit latency:   p50 {percentile(latencies, 50):.3f}s, p95 {percentile(latencies, 95):.3f}s")
+    print(f"detection lag:    p50 {percentile(detection_lags, 50):.2f}s, max {max(detection_lags):.2f}s")
+    print(f"monitoring:       {fake.n_commands - submit_commands} commands, {monitor_queries} schedd queries")
+    print(f"total:            {total_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,3 +24,11 @@ class CondorJobRemovedError(Exception):
 
 class CondorJobFailedError(Exception):
     pass
+
+
+class RemoteCommandError(Exception):
+    pass
+
+
+class CondorJobNotFoundError(Exception):
+    pass
@@ -0,0 +1,423 @@
+"""
+Local stand-in for lxplus and its HTCondor schedd, for offline testing and benchmarking
+
+Commands sent to a `FakeSSHClient` run in a local bash where `myschedd`, `condor_submit`,
+`condor_submit_dag`, `condor_q`, `condor_history` and `condor_rm` are stubs
+re-entering this module. Jobs are never executed: each one walks through scripted status
+transitions from its submission time, writing the matching events to its user log, and ends
+with the configured final status. Remote paths are local paths.
+"""
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+STATE_FNAME = "state.json"
+STUBS = ("myschedd", "condor_submit", "condor_submit_dag", "condor_q", "condor_history", "condor_rm")
+STATUS_CODES = {
+    "IDLE": 1,
+    "RUNNING": 2,
+    "REMOVED": 3,
+    "COMPLETED": 4,
+    "HELD": 5,
+    "TRANSFERRING_OUTPUT": 6,
+    "SUSPENDED": 7,
+}
+TERMINAL_STATUSES = ("COMPLETED", "REMOVED")
+EVENTS = {
+    "IDLE": ("000", "Job submitted from host: <127.0.0.1>"),
+    "RUNNING": ("001", "Job executing on host: <127.0.0.1>"),
+    "TRANSFERRING_OUTPUT": ("040", "Started transferring output files"),
+    "SUSPENDED": ("010", "Job was suspended."),
+    "HELD": ("012", "Job was held.\n\tFake HTCondor hold"),
+    "REMOVED": ("009", "Job was aborted.\n\tvia condor_rm"),
+    "COMPLETED": (
+        "005",
+        "Job terminated.\n\t(1) Normal termination (return value {exit_code})\n"
+        "\tPartitionable Resources :    Usage  Request Allocated\n"
+        "\t   Cpus                 :                 1         1\n"
+        "\t   Disk (KB)            :   100000    100000    100000\n"
+        "\t   Memory (MB)          :     1024      2048      2048",
+    ),
+}
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeHTCondor:
+    """
+    Fake schedd rooted at `root_dir`, every job spends `transitions` ([(status, seconds), ...]) from
+    submission, then reaches `final_status`. `latency` (seconds) is added to every SSH command
+    and `schedd_latency` to every HTCondor command. `history_size` bounds the finished jobs kept by
+    condor_history, like a rotated history.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        transitions: list[tuple[str, float]] = (("IDLE", 1.0), ("RUNNING", 2.0)),
+        final_status: str = "COMPLETED",
+        exit_code: int = 0,
+        latency: float = 0.0,
+        schedd_latency: float = 0.0,
+        schedd: str = "bigbird00.cern.ch",
+        history_size: int | None = None,
+    ):
+        self.root_dir = os.path.abspath(root_dir)
+        self.bin_dir = os.path.join(self.root_dir, "bin")
+        self.latency = latency
+        self.n_commands = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.bin_dir, exist_ok=True)
+        for stub in STUBS:
+            fpath = os.path.join(self.bin_dir, stub)
+            with open(fpath, "w") as f:
+                f.write(f'#!/bin/sh\nexec {sys.executable} -m utils.htcondor.fake {stub} "$@"\n')
+            os.chmod(fpath, 0o755)  # noqa: S103
+
+        with locked_state(self.root_dir, create=True) as state:
+            state["config"] = {
+                "transitions": [list(transition) for transition in transitions],
+                "final_status": final_status,
+                "exit_code": exit_code,
+                "schedd_latency": schedd_latency,
+                "schedd": schedd,
+                "history_size": history_size,
+            }
+            state.setdefault("next_cluster_id", 1)
+            state.setdefault("jobs", {})
+
+    @property
+    def env(self) -> dict[str, str]:
+        pythonpath = os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")]))
+        return {
+            **os.environ,
+            "PATH": f"{self.bin_dir}{os.pathsep}{os.environ['PATH']}",
+            "PYTHONPATH": pythonpath,
+            "FAKE_HTCONDOR_ROOT": self.root_dir,
+        }
+
+    @property
+    def schedd_queries(self) -> int:
+        with locked_state(self.root_dir) as state:
+            return state.get("schedd_queries", 0)
+
+    def jobs(self) -> dict[int, dict]:
+        with locked_state(self.root_dir) as state:
+            refresh(state)
+            return {int(cluster_id): job for cluster_id, job in state["jobs"].items()}
+
+    def connect(self, server: str, user: str, pwd: str) -> "FakeSSHClient":
+        return FakeSSHClient(self)
+
+    def install(self) -> None:
+        """
+        Hand out connections to this fake instead of lxplus, for every executor of the process
+        """
+        # Imported here so the command stubs don't pay for importing paramiko
+        from .pool import connection_pool
+
+        connection_pool.clear()
+        connection_pool.connect = self.connect
+
+    def uninstall(self) -> None:
+        from .pool import connection_pool
+
+        connection_pool.clear()
+        del connection_pool.connect
+
+
+class FakeChannel:
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.output = {}
+        self.readers = [
+            threading.Thread(target=self._read, args=(name, stream), daemon=True)
+            for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def _read(self, name: str, stream) -> None:
+        self.output[name] = stream.read()
+
+    def sendall(self, data: bytes) -> None:
+        self.process.stdin.write(data)
+
+    def shutdown_write(self) -> None:
+        self.process.stdin.close()
+
+    def recv_exit_status(self) -> int:
+        return self.process.wait()
+
+    def read(self, name: str) -> bytes:
+        for reader in self.readers:
+            reader.join()
+        return self.output[name]
+
+
+class FakeChannelFile:
+    def __init__(self, channel: FakeChannel, name: str):
+        self.channel = channel
+        self.name = name
+
+    def read(self) -> bytes:
+        return self.channel.read(self.name)
+
+
+class FakeTransport:
+    def is_active(self) -> bool:
+        return True
+
+    def send_ignore(self) -> None:
+        pass
+
+    def set_keepalive(self, interval: int) -> None:
+        pass
+
+
+class FakeSFTPClient:
+    def put(self, local_fpath: str, remote_fpath: str) -> None:
+        shutil.copyfile(local_fpath, remote_fpath)
+
+    def putfo(self, fl, remote_fpath: str) -> None:
+        with open(remote_fpath, "wb") as f:
+            shutil.copyfileobj(fl, f)
+
+    def get(self, remote_fpath: str, local_fpath: str) -> None:
+        shutil.copyfile(remote_fpath, local_fpath)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "FakeSFTPClient":
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback) -> None:
+        self.close()
+
+
+class FakeSSHClient:
+    """
+    The subset of `paramiko.SSHClient` used by the executors, running commands locally
+    """
+
+    def __init__(self, htcondor: FakeHTCondor):
+        self.htcondor = htcondor
+        self.transport = FakeTransport()
+
+    def exec_command(self, command: str):
+        with self.htcondor.lock:
+            self.htcondor.n_commands += 1
+        time.sleep(self.htcondor.latency)
+        # HTCondor writes user log events as they happen, not only when it is queried
+        with locked_state(self.htcondor.root_dir) as state:
+            refresh(state)
+        process = subprocess.Popen(  # noqa: S603
+            ["bash", "-c", command],  # noqa: S607
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.htcondor.env,
+            cwd=self.htcondor.root_dir,
+        )
+        channel = FakeChannel(process)
+        return process.stdin, FakeChannelFile(channel, "stdout"), FakeChannelFile(channel, "stderr")
+
+    def get_transport(self) -> FakeTransport:
+        return self.transport
+
+    def open_sftp(self) -> FakeSFTPClient:
+        return FakeSFTPClient()
+
+    def close(self) -> None:
+        pass
+
+
+@contextmanager
+def locked_state(root_dir: str, create: bool = False):
+    fpath = os.path.join(root_dir, STATE_FNAME)
+    with open(fpath, "a+" if create else "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        content = f.read()
+        state = json.loads(content) if content else {}
+        yield state
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+
+
+def job_history(config: dict, job: dict, now: float) -> list[tuple[str, float]]:
+    """
+    Statuses reached by `job` at `now`, with the time each one was reached
+    """
+    if job.get("removed_at") is not None:
+        now = min(now, job["removed_at"])
+    history = []
+    reached_at = job["submitted_at"]
+    for status, duration in config["transitions"]:
+        if reached_at > now:
+            break
+        history.append((status, reached_at))
+        reached_at += duration
+    else:
+        if reached_at <= now:
+            history.append((config["final_status"], reached_at))
+    if job.get("removed_at") is not None:
+        history.append(("REMOVED", job["removed_at"]))
+    return history
+
+
+def refresh(state: dict) -> None:
+    """
+    Move every job to its current status and append the new events to its user log
+    """
+    config = state["config"]
+    now = time.time()
+    for cluster_id, job in state["jobs"].items():
+        history = job_history(config, job, now)
+        job["status"] = history[-1][0]
+        if job["status"] in TERMINAL_STATUSES and job.get("finished_at") is None:
+            job["finished_at"] = history[-1][1]
+            for fname in (f"{cluster_id}_0.out", f"{cluster_id}_0.err"):
+                open(os.path.join(job["iwd"], fname), "a").close()
+
+        new_events = history[job["logged_events"] :]
+        if not new_events or not job["log"]:
+            continue
+        with open(os.path.join(job["iwd"], job["log"]), "a") as f:
+            for status, reached_at in new_events:
+                code, text = EVENTS[status]
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reached_at))
+                text = text.format(exit_code=config["exit_code"])
+                f.write(f"{code} ({int(cluster_id):03d}.000.000) {timestamp} {text}\n...\n")
+        job["logged_events"] = len(history)
+
+
+def job_ad(config: dict, cluster_id: str, job: dict) -> dict:
+    ad = {
+        "ClusterId": int(cluster_id),
+        "ProcId": 0,
+        "JobStatus": STATUS_CODES[job["status"]],
+        "Iwd": job["iwd"],
+        "RemoteWallClockTime": max((job.get("finished_at") or time.time()) - job["submitted_at"], 0.0),
+        "MemoryUsage": 1024,
+        "DiskUsage": 100000,
+    }
+    if job["status"] == "COMPLETED":
+        ad["ExitCode"] = config["exit_code"]
+    if job["status"] == "HELD":
+        ad["HoldReason"] = "Fake HTCondor hold"
+    return ad
+
+
+def parse_options(args: list[str], flags: tuple[str, ...] = ()) -> tuple[dict[str, str], list[str]]:
+    options = {}
+    positional = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in flags:
+            options[arg] = ""
+        elif arg.startswith("-"):
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    return options, positional
+
+
+def print_ads(config: dict, jobs: dict, cluster_ids: list[str], attributes: str | None) -> None:
+    ads = [job_ad(config, cluster_id, jobs[cluster_id]) for cluster_id in cluster_ids]
+    if attributes:
+        names = attributes.split(",")
+        ads = [{key: value for key, value in ad.items() if key in names} for ad in ads]
+    if ads:
+        print(json.dumps(ads, indent=2))
+
+
+def submit(state: dict, submit_fpath: str, is_dag: bool) -> int:
+    cluster_id = str(state["next_cluster_id"])
+    state["next_cluster_id"] += 1
+    log = f"{submit_fpath}.dagman.log" if is_dag else None
+    if not is_dag:
+        with open(submit_fpath) as f:
+            match = re.search(r"^log\s*=\s*(.+)$", f.read(), re.MULTILINE)
+        log = match.group(1).strip().replace("$(ClusterId)", cluster_id) if match else None
+    state["jobs"][cluster_id] = {
+        "submitted_at": time.time(),
+        "iwd": os.getcwd(),
+        "log": log,
+        "logged_events": 0,
+        "status": "IDLE",
+    }
+    return int(cluster_id)
+
+
+def main(command: str, args: list[str]) -> int:
+    root_dir = os.environ["FAKE_HTCONDOR_ROOT"]
+    with locked_state(root_dir) as state:
+        config = state["config"]
+        time.sleep(config["schedd_latency"])
+        refresh(state)
+        jobs = state["jobs"]
+        options, positional = parse_options(args, flags=("-json", "-long"))
+
+        if command == "myschedd":
+            user = os.environ.get("USER", "fake")
+            print(f"Selected best schedd '{config['schedd']}' for user '{user}' in pool 'fake'")
+            return 0
+
+        if command in ("condor_submit", "condor_submit_dag"):
+            if not positional or not os.path.isfile(positional[0]):
+                print(f"ERROR: Can't open submit file {positional[:1]}", file=sys.stderr)
+                return 1
+            cluster_id = submit(state, positional[0], command == "condor_submit_dag")
+            refresh(state)
+            print(f"Submitting job(s).\n1 job(s) submitted to cluster {cluster_id}.")
+            return 0
+
+        if command in ("condor_q", "condor_history"):
+            state["schedd_queries"] = state.get("schedd_queries", 0) + 1
+            in_queue = command == "condor_q"
+            cluster_ids = [
+                cluster_id
+                for cluster_id, job in jobs.items()
+                if (job["status"] not in TERMINAL_STATUSES) == in_queue and (not positional or cluster_id in positional)
+            ]
+            constraint = options.get("-constraint")
+            if constraint:
+                constrained = set(re.findall(r"ClusterId == (\d+)", constraint))
+                cluster_ids = [cluster_id for cluster_id in cluster_ids if cluster_id in constrained]
+            if not in_queue:
+                finished = sorted(jobs, key=lambda cluster_id: -(jobs[cluster_id].get("finished_at") or 0))
+                rotated = set(finished[config["history_size"] :]) if config["history_size"] is not None else set()
+                cluster_ids = sorted(cluster_ids, key=lambda cluster_id: -jobs[cluster_id]["finished_at"])
+                cluster_ids = [cluster_id for cluster_id in cluster_ids if cluster_id not in rotated]
+                cluster_ids = cluster_ids[: int(options.get("-limit", len(cluster_ids)))]
+            print_ads(config, jobs, cluster_ids, options.get("-attributes"))
+            return 0
+
+        if command == "condor_rm":
+            cluster_id = positional[0] if positional else None
+            if cluster_id not in jobs or jobs[cluster_id]["status"] in TERMINAL_STATUSES:
+                print(f"Couldn't find/remove all jobs in cluster {cluster_id}", file=sys.stderr)
+                return 1
+            jobs[cluster_id]["removed_at"] = time.time()
+            refresh(state)
+            print(f"All jobs in cluster {cluster_id} have been marked for removal")
+            return 0
+
+    print(f"{command}: unsupported command", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(os.path.basename(sys.argv[1]), sys.argv[2:]))
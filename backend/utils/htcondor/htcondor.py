@@ -1,6 +1,7 @@
 import json
+import logging
 import re
-import time
+import shlex
 from typing import ClassVar
 
 from .exceptions import (
@@ -12,9 +13,16 @@ from .exceptions import (
     CondorSubmitError,
     MyScheddBumpError,
 )
+from .monitor import parse_user_log, resource_usage
 from .ssh import SSHExecutor
 
 
+logger = logging.getLogger(__name__)
+
+# Precedes each user log in the output of jobs_log_status
+USER_LOG_MARKER = "==> dc3-user-log "
+
+
 class HTCondorExecutor(SSHExecutor):
     STATUS: ClassVar[dict[int, str]] = {
         1: "IDLE",
@@ -47,6 +55,18 @@ class HTCondorExecutor(SSHExecutor):
 
         return job_id
 
+    def condor_submit_dag(self, remote_directory: str, dag_file: str):
+        _, stdout, stderr = self.client.exec_command(f"cd {remote_directory} && condor_submit_dag {dag_file}")
+        stdout = stdout.read().decode("utf-8").strip()
+
+        # Only the DAGMan job is submitted here, it submits the DAG nodes itself
+        match = re.search(r"1 job\(s\) submitted to cluster (\d+)", stdout)
+        if match is None:
+            stderr = stderr.read().decode("utf-8").strip()
+            raise CondorSubmitError(stderr or stdout)
+
+        return int(match.group(1))
+
     def condor_q(
         self,
         schedd: str | None = None,
@@ -92,40 +112,92 @@ class HTCondorExecutor(SSHExecutor):
         stdout = stdout.read().decode("utf-8").strip()
         return stdout
 
-    def wait_job(self, schedd: str | None, job_id: str | None, interval: int = 10):
-        status = None
-        while True:
-            status = self.condor_q(schedd, job_id, long=True, as_json=True).strip()
-            if status == "":
-                status = self.condor_history(schedd, job_id, long=True, as_json=True, limit=1)
-
-            status = json.loads(status)
-            if len(status) == 0:
+    def jobs_status(
+        self, schedd: str | None, cluster_ids: list[int], log_fpaths: dict[int, str] | None = None
+    ) -> dict[int, dict]:
+        """
+        Status of many jobs at once, from their user log in `log_fpaths` (all read in a single round
+        trip, without querying the schedd). Jobs without a log event yet (log not written, or lost) fall
+        back to one condor_q for all of them, plus one condor_history for the ones that already left
+        the queue. Jobs found nowhere are missing from the result.
+        """
+        result = self.jobs_log_status(log_fpaths) if log_fpaths else {}
+        missing = [cluster_id for cluster_id in cluster_ids if cluster_id not in result]
+        if missing:
+            result.update(self.jobs_schedd_status(schedd, missing))
+        return result
+
+    def jobs_schedd_status(self, schedd: str | None, cluster_ids: list[int]) -> dict[int, dict]:
+        name = f"-name {schedd} " if schedd else ""
+        attributes = "-attributes ClusterId,JobStatus,ExitCode,Iwd,HoldReason,MemoryUsage,DiskUsage,RemoteWallClockTime"
+        output = self.run_script([f"condor_q {name}-json {attributes} {' '.join(map(str, cluster_ids))}"])
+        result = {ad["ClusterId"]: ad for ad in json.loads(output or "[]")}
+
+        missing = [cluster_id for cluster_id in cluster_ids if cluster_id not in result]
+        if missing:
+            constraint = shlex.quote(" || ".join(f"ClusterId == {cluster_id}" for cluster_id in missing))
+            limit = f"-limit {len(missing)}"
+            output = self.run_script([f"condor_history {name}-json {attributes} {limit} -constraint {constraint}"])
+            result.update({ad["ClusterId"]: ad for ad in json.loads(output or "[]")})
+
+        for ad in result.values():
+            ad["JobStatus"] = self.STATUS[ad.get("JobStatus")]
+        return result
+
+    def jobs_log_status(self, log_fpaths: dict[int, str]) -> dict[int, dict]:
+        """
+        Status (and exit code and resource usage once terminated) of jobs from the last event of their
+        user log, all logs being read in a single round trip. Jobs without a (readable) log event are
+        missing from the result.
+        """
+        commands = [
+            f"echo {shlex.quote(f'{USER_LOG_MARKER}{cluster_id}')}; cat {shlex.quote(fpath)} 2> /dev/null"
+            for cluster_id, fpath in log_fpaths.items()
+        ]
+        output = self.run_script(["{ " + "; ".join(commands) + "; }"], check=False)
+
+        result = {}
+        for chunk in output.split(USER_LOG_MARKER)[1:]:
+            cluster_id, _, content = chunk.partition("\n")
+            cluster_id = int(cluster_id)
+            events, _ = parse_user_log(content)
+            events = [event for event in events if event.cluster_id == cluster_id and event.status is not None]
+            if len(events) == 0:
                 continue
-            status = status[0]
-            status["JobStatus"] = self.STATUS[status.get("JobStatus")]
-            if status["JobStatus"] == "HELD":
-                self.condor_rm(job_id, schedd)
-                raise CondorJobHeldError()
-            elif status["JobStatus"] == "SUSPENDED":
-                self.condor_rm(job_id, schedd)
-                raise CondorJobSuspendedError()
-            elif status["JobStatus"] == "REMOVED":
-                raise CondorJobRemovedError()
-            elif status["JobStatus"] == "COMPLETED":
-                err_content = self.cat(f"{status.get('Iwd')}/{job_id}_0.err")
-                if "Traceback (most recent call last):" in err_content:
-                    traceback_err = err_content.strip().split("\n")
-                    traceback_err = "\n".join(
-                        traceback_err[traceback_err.index("Traceback (most recent call last):") :]
-                    )
-                    raise CondorJobFailedError(traceback_err)
-                break
-
-            # IDLE, RUNNING, TRANSFERRING_OUTPUT
-            time.sleep(interval)
-
-        return status
+            ad = {"ClusterId": cluster_id, "JobStatus": events[-1].status, **resource_usage(events)}
+            if events[-1].return_value is not None:
+                ad["ExitCode"] = events[-1].return_value
+            result[cluster_id] = ad
+        return result
+
+    @staticmethod
+    def raise_for_traceback(err_content: str):
+        if "Traceback (most recent call last):" in err_content:
+            traceback_err = err_content.strip().split("\n")
+            traceback_err = "\n".join(traceback_err[traceback_err.index("Traceback (most recent call last):") :])
+            raise CondorJobFailedError(traceback_err)
+
+    def check_job_stderr(self, remote_work_path: str, job_id: str):
+        self.raise_for_traceback(self.cat(f"{remote_work_path}/{job_id}_0.err"))
+
+    def check_work_dir_stderr(self, remote_work_path: str):
+        """
+        Same as `check_job_stderr`, for all jobs submitted from `remote_work_path` (e.g. the nodes of a DAG)
+        """
+        work_path = shlex.quote(remote_work_path)
+        output = self.run_script([f"grep -l 'Traceback (most recent call last):' {work_path}/*.err"], check=False)
+        for fpath in output.split():
+            self.raise_for_traceback(self.cat(fpath))
+
+    def raise_for_status(self, schedd: str | None, job_id: str, status: str):
+        if status == "HELD":
+            self.condor_rm(job_id, schedd)
+            raise CondorJobHeldError()
+        elif status == "SUSPENDED":
+            self.condor_rm(job_id, schedd)
+            raise CondorJobSuspendedError()
+        elif status == "REMOVED":
+            raise CondorJobRemovedError()
 
     def condor_rm(self, job_id: str, schedd: str | None = None):
         cmd = "condor_rm"
@@ -141,5 +213,17 @@ class HTCondorExecutor(SSHExecutor):
         stderr = stderr.read().decode("utf-8").strip()
         raise CondorRmError(stderr)
 
+    def archive_work_dir(self, remote_work_path: str, remote_history_path: str) -> None:
+        """
+        Move the job files (submit files, logs, stdout/stderr) to the results directory and
+        remove the working directory, in a single round trip
+        """
+        work_path = shlex.quote(remote_work_path)
+        history_path = shlex.quote(remote_history_path)
+        self.run_script(
+            [f"mkdir -p {history_path}", f"{{ mv {work_path}/* {history_path}; rm -rf {work_path}; }}"],
+            check=False,
+        )
+
     def __enter__(self) -> "HTCondorExecutor":
         return self
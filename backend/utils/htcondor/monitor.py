@@ -0,0 +1,97 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+
+# HTCondor user log event codes and the job status they lead to
+EVENT_STATUS = {
+    0: "IDLE",  # Submitted
+    1: "RUNNING",  # Executing
+    4: "IDLE",  # Evicted
+    5: "COMPLETED",  # Terminated
+    9: "REMOVED",  # Aborted
+    10: "SUSPENDED",
+    11: "RUNNING",  # Unsuspended
+    12: "HELD",
+    13: "IDLE",  # Released
+    40: "TRANSFERRING_OUTPUT",  # File transfer
+}
+
+EXECUTE_EVENT = 1
+TERMINATED_EVENT = 5
+
+EVENT_HEADER_REGEX = re.compile(r"^(\d{3}) \((\d+)\.(\d+)\.(\d+)\)")
+TIMESTAMP_REGEX = re.compile(r"^\d{3} \(\S+\) (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+RETURN_VALUE_REGEX = re.compile(r"\(return value (-?\d+)\)")
+# Usage column of the partitionable resources table of terminated events, named after the job ad attributes
+USAGE_REGEXES = {
+    "MemoryUsage": re.compile(r"^\s*Memory \(MB\)\s*:\s*(\d+)", re.MULTILINE),
+    "DiskUsage": re.compile(r"^\s*Disk \(KB\)\s*:\s*(\d+)", re.MULTILINE),
+}
+EVENT_SEPARATOR = "...\n"
+
+
+@dataclass
+class UserLogEvent:
+    code: int
+    cluster_id: int
+    proc_id: int
+    text: str
+
+    @property
+    def status(self) -> str | None:
+        return EVENT_STATUS.get(self.code)
+
+    @property
+    def return_value(self) -> int | None:
+        match = RETURN_VALUE_REGEX.search(self.text)
+        return int(match.group(1)) if match else None
+
+    @property
+    def timestamp(self) -> datetime | None:
+        # ISO dates, the default user log format of recent HTCondor versions
+        match = TIMESTAMP_REGEX.match(self.text.lstrip())
+        return datetime.fromisoformat(match.group(1)) if match else None
+
+
+def resource_usage(events: list[UserLogEvent]) -> dict[str, float]:
+    """
+    Peak usage of a terminated job from its user log events, as the job ad attributes condor_history would return
+    """
+    if len(events) == 0 or events[-1].code != TERMINATED_EVENT:
+        return {}
+    terminated = events[-1]
+    usage = {}
+    for key, regex in USAGE_REGEXES.items():
+        match = regex.search(terminated.text)
+        if match:
+            usage[key] = int(match.group(1))
+    # Wall clock time of the last execution, an evicted job restarts from scratch
+    executed = [event for event in events if event.code == EXECUTE_EVENT]
+    if executed and executed[-1].timestamp and terminated.timestamp:
+        usage["RemoteWallClockTime"] = (terminated.timestamp - executed[-1].timestamp).total_seconds()
+    return usage
+
+
+def parse_user_log(content: str) -> tuple[list[UserLogEvent], int]:
+    """
+    Parse the complete events of a (chunk of) HTCondor user log
+
+    Return the events and the number of characters consumed, a trailing
+    event still being written is left for the next read.
+    """
+    events = []
+    consumed = 0
+    while True:
+        end = content.find(EVENT_SEPARATOR, consumed)
+        if end == -1:
+            break
+        text = content[consumed:end]
+        consumed = end + len(EVENT_SEPARATOR)
+        match = EVENT_HEADER_REGEX.match(text.lstrip())
+        if match is None:
+            continue
+        code, cluster_id, proc_id, _ = (int(value) for value in match.groups())
+        events.append(UserLogEvent(code, cluster_id, proc_id, text))
+
+    return events, consumed
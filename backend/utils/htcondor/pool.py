@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+import time
+
+import paramiko
+
+
+logger = logging.getLogger(__name__)
+
+
+class SSHConnectionPool:
+    """
+    Authenticated SSH connections kept open between tasks of the same worker process
+
+    Connecting and authenticating to lxplus takes seconds, so released connections are
+    kept (with keepalive) and handed out again for the same server and user. Connections
+    are health checked before reuse and dropped when dead or idle for too long.
+    The pool is reset when used from a forked process, connections are never shared.
+
+    Connections only outlive a task in long-lived processes: a worker recycling its processes
+    after every task (--max-tasks-per-child=1) opens a new connection for each of them. In
+    production the HTCondor tasks run on their own queue (CONDOR_TASKS_QUEUE), served by a
+    worker that keeps its processes.
+    """
+
+    KEEPALIVE_INTERVAL = 30
+    MAX_IDLE_TIME = 10 * 60
+    MAX_IDLE_CONNECTIONS = 2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.idle: dict[tuple[str, str], list[tuple[paramiko.SSHClient, float]]] = {}
+
+    def _check_pid(self):
+        # Connections inherited from the parent process share its sockets, forget them without closing
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.idle = {}
+
+    @staticmethod
+    def is_healthy(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except (EOFError, OSError, paramiko.SSHException):
+            return False
+        return True
+
+    def connect(self, server: str, user: str, pwd: str) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # noqa: S507
+        client.connect(server, username=user, password=pwd)
+        client.get_transport().set_keepalive(self.KEEPALIVE_INTERVAL)
+        return client
+
+    def acquire(self, server: str, user: str, pwd: str) -> paramiko.SSHClient:
+        with self.lock:
+            self._check_pid()
+            idle = self.idle.get((server, user), [])
+            while idle:
+                client, released_at = idle.pop()
+                if time.monotonic() - released_at < self.MAX_IDLE_TIME and self.is_healthy(client):
+                    return client
+                client.close()
+
+        logger.info("Opening new SSH connection to %s@%s", user, server)
+        return self.connect(server, user, pwd)
+
+    def release(self, server: str, user: str, client: paramiko.SSHClient):
+        with self.lock:
+            self._check_pid()
+            idle = self.idle.setdefault((server, user), [])
+            if len(idle) >= self.MAX_IDLE_CONNECTIONS or not self.is_healthy(client):
+                client.close()
+                return
+            idle.append((client, time.monotonic()))
+
+    def clear(self):
+        with self.lock:
+            self._check_pid()
+            for idle in self.idle.values():
+                for client, _ in idle:
+                    client.close()
+            self.idle = {}
+
+
+connection_pool = SSHConnectionPool()
@@ -1,8 +1,17 @@
+import hashlib
 import logging
+import os
+import shlex
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import paramiko
 
+from .exceptions import RemoteCommandError
+from .pool import connection_pool
+
 
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 
@@ -12,9 +21,16 @@ class SSHExecutor:
 
     def __init__(self, lxplus_user: str, lxplus_pwd: str, timeout: int = 5 * 60):
         self.timeout = timeout
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client.connect(self.SERVER, username=lxplus_user, password=lxplus_pwd)
+        self.user = lxplus_user
+        self.client = connection_pool.acquire(self.SERVER, lxplus_user, lxplus_pwd)
+        self._sftp = None
+
+    @property
+    def sftp(self) -> paramiko.SFTPClient:
+        # One SFTP session per executor, opened on first use
+        if self._sftp is None:
+            self._sftp = self.client.open_sftp()
+        return self._sftp
 
     def ls(self, remote_path: str) -> list:
         _, stdout, _ = self.client.exec_command(f"ls {remote_path}")
@@ -52,14 +68,146 @@ class SSHExecutor:
         return True if stdout == "Success" else False
 
     def put_file(self, local_fpath: str, remote_fpath: str):
-        sftp = self.client.open_sftp()
-        sftp.put(local_fpath, remote_fpath)
-        sftp.close()
+        self.sftp.put(local_fpath, remote_fpath)
+
+    def put_files(self, local_dir: str, fpaths: list[str], remote_dir: str):
+        remote_dirs = sorted({os.path.dirname(f"{remote_dir}/{fpath}") for fpath in fpaths})
+        if remote_dirs:
+            self.mkdir(" ".join(remote_dirs))
+        for fpath in fpaths:
+            self.sftp.put(os.path.join(local_dir, fpath), f"{remote_dir}/{fpath}")
 
     def put_str_as_file(self, file_content: str, remote_fpath: str):
-        sftp = self.client.open_sftp()
-        sftp.putfo(BytesIO(file_content.encode()), remote_fpath)
-        sftp.close()
+        self.sftp.putfo(BytesIO(file_content.encode()), remote_fpath)
+
+    def run_script(self, commands: list[str], stdin: bytes | None = None, check: bool = True) -> str:
+        """
+        Run all `commands` in a single remote shell (one round trip), stopping at the first failure
+        """
+        _, stdout, stderr = self.client.exec_command(" && ".join(commands))
+        if stdin is not None:
+            stdout.channel.sendall(stdin)
+            stdout.channel.shutdown_write()
+        output = stdout.read().decode("utf-8")
+        exit_status = stdout.channel.recv_exit_status()
+        if check and exit_status != 0:
+            raise RemoteCommandError(stderr.read().decode("utf-8").strip())
+        return output
+
+    def stage_bundle(
+        self,
+        remote_dir: str,
+        files: dict[str, str],
+        local_dir: str | None = None,
+        local_fpaths: list[str] | None = None,
+        executables: list[str] | None = None,
+        extra_dirs: list[str] | None = None,
+    ) -> None:
+        """
+        Upload in-memory `files` ({relative path: content}) and `local_fpaths` (relative to `local_dir`)
+        to `remote_dir` as a single tar.gz streamed through one remote command, which also creates
+        `remote_dir` and `extra_dirs` and unpacks the bundle
+        """
+        executables = executables or []
+        buffer = BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for fpath, content in files.items():
+                data = content.encode()
+                info = tarfile.TarInfo(fpath)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                info.mode = 0o755 if fpath in executables else 0o644
+                tar.addfile(info, BytesIO(data))
+            for fpath in local_fpaths or []:
+                tar.add(os.path.join(local_dir, fpath), arcname=fpath)
+
+        remote_dirs = " ".join(shlex.quote(path) for path in [remote_dir, *(extra_dirs or [])])
+        self.run_script(
+            [f"mkdir -p {remote_dirs}", f"tar -xzf - -C {shlex.quote(remote_dir)}"], stdin=buffer.getvalue()
+        )
+
+    def remote_manifest(self, remote_dir: str) -> dict[str, tuple[int, int]]:
+        """
+        Size and modification time of every file under `remote_dir` ({relative path: (size, mtime)}), in one round trip
+        """
+        output = self.run_script([f"find {shlex.quote(remote_dir)} -type f -printf '%P\\t%s\\t%T@\\n'"])
+        manifest = {}
+        for line in output.splitlines():
+            fpath, size, mtime = line.rsplit("\t", 2)
+            manifest[fpath] = (int(size), int(float(mtime)))
+        return manifest
+
+    def remote_checksums(self, remote_dir: str, fpaths: list[str]) -> dict[str, str]:
+        if not fpaths:
+            return {}
+        stdin = "\0".join(fpaths).encode()
+        output = self.run_script([f"cd {shlex.quote(remote_dir)}", "xargs -0 md5sum"], stdin=stdin)
+        return {line[34:]: line[:32] for line in output.splitlines()}
+
+    @staticmethod
+    def local_checksum(fpath: str) -> str:
+        checksum = hashlib.md5()  # noqa: S324
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def _get_files(self, remote_dir: str, local_dir: str, files: list[tuple[str, int]]) -> None:
+        # Each stream has its own SFTP session, multiplexed over the same SSH connection
+        with self.client.open_sftp() as sftp:
+            for fpath, mtime in files:
+                local_fpath = os.path.join(local_dir, fpath)
+                os.makedirs(os.path.dirname(local_fpath), exist_ok=True)
+                # Hidden like the temporary files of the results writer, so it is never listed nor archived
+                tmp_fpath = os.path.join(os.path.dirname(local_fpath), f".{os.path.basename(local_fpath)}.part")
+                sftp.get(f"{remote_dir}/{fpath}", tmp_fpath)
+                os.utime(tmp_fpath, (mtime, mtime))
+                os.replace(tmp_fpath, local_fpath)
+
+    def sync_dir(self, remote_dir: str, local_dir: str, streams: int = 4) -> dict[str, int]:
+        """
+        Copy the files of `remote_dir` missing or outdated in `local_dir`, over `streams` parallel SFTP sessions
+
+        Files with the same size and modification time are skipped. Files with the same size but
+        a different modification time (e.g. rewritten by a retried job) are compared by checksum
+        and only have their modification time updated when identical.
+        """
+        manifest = self.remote_manifest(remote_dir)
+        outdated = {}
+        same_size = []
+        for fpath, (size, mtime) in manifest.items():
+            if os.path.normpath(fpath).startswith(".."):
+                continue
+            try:
+                stat = os.stat(os.path.join(local_dir, fpath))
+            except FileNotFoundError:
+                outdated[fpath] = (size, mtime)
+                continue
+            if stat.st_size != size:
+                outdated[fpath] = (size, mtime)
+            elif int(stat.st_mtime) != mtime:
+                same_size.append(fpath)
+
+        for fpath, checksum in self.remote_checksums(remote_dir, same_size).items():
+            mtime = manifest[fpath][1]
+            if checksum == self.local_checksum(os.path.join(local_dir, fpath)):
+                os.utime(os.path.join(local_dir, fpath), (mtime, mtime))
+            else:
+                outdated[fpath] = manifest[fpath]
+
+        # Largest files first, dealt round robin so every stream gets a similar amount of bytes
+        ordered = sorted(outdated.items(), key=lambda item: item[1][0], reverse=True)
+        batches = [[(fpath, mtime) for fpath, (_, mtime) in ordered[i::streams]] for i in range(streams)]
+        with ThreadPoolExecutor(max_workers=streams) as executor:
+            futures = [executor.submit(self._get_files, remote_dir, local_dir, batch) for batch in batches if batch]
+            for future in futures:
+                future.result()
+
+        return {
+            "files": len(manifest),
+            "transferred": len(outdated),
+            "transferred_bytes": sum(size for size, _ in outdated.values()),
+        }
 
     def __enter__(self) -> "SSHExecutor":
         return self
@@ -68,4 +216,10 @@ class SSHExecutor:
         self.close()
 
     def close(self) -> None:
-        self.client.close()
+        # The connection goes back to the pool, only the SFTP session is closed
+        if self._sftp is not None:
+            self._sftp.close()
+            self._sftp = None
+        if self.client is not None:
+            connection_pool.release(self.SERVER, self.user, self.client)
+            self.client = None
@@ -1,3 +1,6 @@
+import ast
+import hashlib
+import os
 import sys
 
 import pkg_resources
@@ -8,7 +11,26 @@ shell_template = """#!/bin/sh
 python3 -m venv venv
 source venv/bin/activate
 {pip_install_packages}
-python3 main.py
+python3 main.py "$@"
+"""
+
+
+# Packages are installed with --target (not in a venv, which can't be relocated) so the directory can
+# be archived once and unpacked by later jobs. The python version is part of the archive name because
+# the worker nodes image may change. Publishing is atomic (rename) and never fails the job.
+cached_env_shell_template = """#!/bin/sh
+
+ENV_ARCHIVE="{env_dir}/{env_hash}-$(python3 -c 'import sys; print("py%d%d" % sys.version_info[:2])').tar.gz"
+if ! {{ [ -f "$ENV_ARCHIVE" ] && tar -xzf "$ENV_ARCHIVE"; }}; then
+    rm -rf site-packages
+    if python3 -m venv build-venv && build-venv/bin/pip install --target site-packages {packages}; then
+        mkdir -p "{env_dir}"
+        tar -czf "$ENV_ARCHIVE.$$" site-packages && mv "$ENV_ARCHIVE.$$" "$ENV_ARCHIVE" || rm -f "$ENV_ARCHIVE.$$"
+    fi
+    rm -rf build-venv
+fi
+export PYTHONPATH="$PWD/site-packages${{PYTHONPATH:+:$PYTHONPATH}}"
+python3 main.py "$@"
 """
 
 
@@ -30,7 +52,10 @@ if __name__ == "__main__":
 
     dc3_config.set_auth_cert_path(os.getenv("CERT_FPATH"))
     dc3_config.set_auth_key_path(os.getenv("KEY_FPATH"))
-    {entrypoint_func}(**input_data)
+    # Extra "key=value" arguments (e.g. the stage of a DAG node) are passed as keyword arguments
+    import sys
+    extra_kwargs = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    {entrypoint_func}(**input_data, **extra_kwargs)
 """
 
 
@@ -58,21 +83,82 @@ def list_thirdparty_in_src(src: str) -> dict[str, str]:
     return result
 
 
-def create_submit_file(request_cpus: int, request_disk: int, request_memory: int, environment: dict[str, str]) -> str:
+def _resolve_local_module(base_dir: str, module: str) -> list[str]:
+    parts = module.split(".")
+    if not os.path.isfile(os.path.join(base_dir, parts[0], "__init__.py")):
+        return []
+
+    # Every parent package __init__ is needed for the import to work remotely
+    result = [os.path.join(*parts[:idx], "__init__.py") for idx in range(1, len(parts) + 1)]
+    result = [fpath for fpath in result if os.path.isfile(os.path.join(base_dir, fpath))]
+    module_fpath = os.path.join(*parts) + ".py"
+    if os.path.isfile(os.path.join(base_dir, module_fpath)):
+        result.append(module_fpath)
+
+    return result
+
+
+def list_local_modules_in_src(src: str, base_dir: str, package: str | None = None) -> list[str]:
+    """
+    List (relative to `base_dir`) all files of local packages imported by the
+    module src code, recursively, so they can be shipped together with it
+    """
+    found = []
+    pending = [(src, package)]
+    while pending:
+        current_src, current_package = pending.pop()
+        modules = []
+        for node in ast.walk(ast.parse(current_src)):
+            if isinstance(node, ast.Import):
+                modules.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                modules.append(node.module)
+                modules.extend(f"{node.module}.{alias.name}" for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and current_package:
+                parent = current_package.split(".")
+                parent = parent[: len(parent) - node.level + 1]
+                base = ".".join([*parent, node.module] if node.module else parent)
+                modules.append(base)
+                modules.extend(f"{base}.{alias.name}" for alias in node.names)
+
+        for module in modules:
+            for fpath in _resolve_local_module(base_dir, module):
+                if fpath in found:
+                    continue
+                found.append(fpath)
+                with open(os.path.join(base_dir, fpath)) as f:
+                    module_package = os.path.dirname(fpath).replace(os.sep, ".")
+                    pending.append((f.read(), module_package))
+
+    return sorted(found)
+
+
+def create_submit_file(
+    request_cpus: int,
+    request_disk: int,
+    request_memory: int,
+    environment: dict[str, str],
+    transfer_input_files: list[str] | None = None,
+    arguments: str | None = None,
+    job_flavour: str = "espresso",
+) -> str:
+    transfer_input_files = transfer_input_files or []
     content = {
         "universe": "vanilla",
         "executable": "main.sh",
-        "transfer_input_files": "main.py, input.json",
-        "+JobFlavour": '"espresso"',
+        "transfer_input_files": ", ".join(["main.py", "input.json", *transfer_input_files]),
+        "+JobFlavour": f'"{job_flavour}"',
         "output": "$(ClusterId)_$(ProcId).out",
         "error": "$(ClusterId)_$(ProcId).err",
         "log": "$(ClusterId).log",
         "RequestCpus": str(request_cpus),
-        "RequestDisk": str(request_disk),  # 124 MB
-        "RequestMemory": str(request_memory),  # 6 GB
+        "RequestDisk": str(request_disk),  # KB
+        "RequestMemory": str(request_memory),  # MB
         "environment": '"' + " ".join([f"{key}={value}" for key, value in environment.items()]) + '"',
         "queue": None,
     }
+    if arguments:
+        content = {"arguments": f'"{arguments}"', **content}
 
     result = []
     for key, value in content.items():
@@ -84,9 +170,36 @@ def create_submit_file(request_cpus: int, request_disk: int, request_memory: int
     return "\n".join(result)
 
 
-def create_shell_script(src: str) -> str:
+def environment_hash(requirements: list[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(requirements)).encode()).hexdigest()[:16]
+
+
+def create_shell_script(
+    src: str,
+    base_dir: str | None = None,
+    local_modules: list[str] | None = None,
+    env_dir: str | None = None,
+) -> str:
+    """
+    Shell script installing the third party packages needed by `src` and running main.py
+
+    With `env_dir`, the installed packages are archived there (keyed by a hash of the package set)
+    by the first job and only unpacked by the following ones.
+    """
+    # Third party packages imported by shipped local modules need to be installed as well
+    for fpath in local_modules or []:
+        with open(os.path.join(base_dir, fpath)) as f:
+            src += "\n" + f.read()
+
     packages = list_thirdparty_in_src(src)
     pip_install_packages = [f"{pkg}=={version}" for pkg, version in packages.items()]
+    if env_dir:
+        return cached_env_shell_template.format(
+            env_dir=env_dir,
+            env_hash=environment_hash(pip_install_packages),
+            packages=" ".join(pip_install_packages),
+        )
+
     pip_install_packages = " ".join(pip_install_packages)
     pip_install_packages = f"pip install {pip_install_packages}"
     return shell_template.format(pip_install_packages=pip_install_packages)
@@ -94,3 +207,18 @@ def create_shell_script(src: str) -> str:
 
 def create_python_script(src: str, entrypoint_func: str) -> str:
     return script_template.format(src=src, entrypoint_func=entrypoint_func)
+
+
+def create_dag_file(
+    jobs: dict[str, str],
+    subdags: dict[str, str] | None = None,
+    dependencies: list[tuple[str, str]] | None = None,
+) -> str:
+    """
+    DAGMan input file with `jobs` and external `subdags` ({node name: submit/DAG file})
+    and `dependencies` between them ([(parent, child), ...])
+    """
+    lines = [f"JOB {name} {fname}" for name, fname in jobs.items()]
+    lines += [f"SUBDAG EXTERNAL {name} {fname}" for name, fname in (subdags or {}).items()]
+    lines += [f"PARENT {parent} CHILD {child}" for parent, child in dependencies or []]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+import logging
+import time
+from datetime import datetime
+
+from libdc3.methods.bril_actions import BrilActions
+
+from .storage import FileCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class BrilLumisCache:
+    """
+    Run-granular cache in front of `BrilActions.fetch_lumis`
+
+    Entries are keyed by the brilcalc parameters that change its output
+    (brilws_version, normtag, unit, beamstatus, amodetag) plus the run number.
+
+    Since it is not possible to know which runs exist in a run interval before
+    asking brilcalc, the cache also keeps track of which intervals were fully
+    fetched (and which runs they contain). Only the parts of the requested
+    interval not covered by a valid interval are sent to brilcalc.
+
+    Normtags are updated over time, so fetched intervals expire after `max_age`
+    seconds. The namespace is kept under `max_size` bytes by evicting the least
+    recently used runs.
+    """
+
+    NAMESPACE = "bril_lumis"
+
+    def __init__(
+        self,
+        ba: BrilActions,
+        cache_dir: str | None = None,
+        max_age: int = 24 * 60 * 60,
+        max_size: int = 2 * 1024**3,
+    ):
+        self.ba = ba
+        self.max_age = max_age
+        self.storage = FileCache(cache_dir, self.NAMESPACE, max_size=max_size) if cache_dir else None
+        self.runs_hits = 0
+        self.runs_misses = 0
+
+    @property
+    def params(self) -> dict:
+        return {
+            "brilws_version": self.ba.brilws_version,
+            "normtag": self.ba.normtag,
+            "unit": self.ba.unit,
+            "beamstatus": self.ba.beamstatus,
+            "amodetag": self.ba.amodetag,
+        }
+
+    def run_key(self, run_number: int) -> dict:
+        return {**self.params, "run_number": run_number}
+
+    def coverage_key(self) -> dict:
+        return {**self.params, "coverage": True}
+
+    def stats(self) -> dict:
+        return {"hits": self.runs_hits, "misses": self.runs_misses}
+
+    def valid_intervals(self) -> list[dict]:
+        entry = self.storage.get(self.coverage_key())
+        intervals = entry["payload"] if entry else []
+        now = time.time()
+        return [
+            interval
+            for interval in intervals
+            if now - interval["created_at"] <= self.max_age
+            and all(self.storage.exists(self.run_key(run_number)) for run_number in interval["runs"])
+        ]
+
+    @staticmethod
+    def uncovered(begin: int, end: int, intervals: list[dict]) -> list[tuple[int, int]]:
+        result = []
+        current = begin
+        for interval in sorted(intervals, key=lambda x: x["begin"]):
+            if interval["end"] < current or interval["begin"] > end:
+                continue
+            if interval["begin"] > current:
+                result.append((current, interval["begin"] - 1))
+            current = max(current, interval["end"] + 1)
+            if current > end:
+                break
+        if current <= end:
+            result.append((current, end))
+        return result
+
+    @staticmethod
+    def serialize(lumis: list[dict]) -> list[dict]:
+        return [{**lumi, "datetime": lumi["datetime"].isoformat()} for lumi in lumis]
+
+    @staticmethod
+    def deserialize(lumis: list[dict]) -> list[dict]:
+        return [{**lumi, "datetime": datetime.fromisoformat(lumi["datetime"])} for lumi in lumis]
+
+    def fetch_lumis(self, begin: int, end: int) -> dict:
+        if self.storage is None:
+            return self.ba.fetch_lumis(begin=begin, end=end)
+
+        intervals = self.valid_intervals()
+        new_intervals = []
+        lumis_by_run = {}
+        for gap_begin, gap_end in self.uncovered(begin, end, intervals):
+            lumis = self.ba.fetch_lumis(begin=gap_begin, end=gap_end).get("detailed")
+            for lumi in lumis:
+                lumis_by_run.setdefault(lumi["run_number"], []).append(lumi)
+            runs = sorted({lumi["run_number"] for lumi in lumis})
+            for run_number in runs:
+                self.storage.set(self.run_key(run_number), self.serialize(lumis_by_run[run_number]))
+            new_intervals.append({"begin": gap_begin, "end": gap_end, "runs": runs, "created_at": time.time()})
+            self.runs_misses += len(runs)
+
+        if new_intervals:
+            # Concurrent jobs extend the coverage meanwhile, merge into its latest version
+            with self.storage.lock(self.coverage_key()):
+                self.storage.set(self.coverage_key(), self.valid_intervals() + new_intervals)
+        intervals += new_intervals
+
+        cached_runs = {run_number for interval in intervals for run_number in interval["runs"]}
+        cached_runs = sorted(run for run in cached_runs if begin <= run <= end and run not in lumis_by_run)
+        for run_number in cached_runs:
+            entry = self.storage.get(self.run_key(run_number))
+            if entry is None:
+                # Evicted by a concurrent job after the coverage was checked
+                lumis_by_run[run_number] = self.ba.fetch_lumis(run_number=run_number).get("detailed")
+                self.storage.set(self.run_key(run_number), self.serialize(lumis_by_run[run_number]))
+                self.runs_misses += 1
+            else:
+                lumis_by_run[run_number] = self.deserialize(entry["payload"])
+                self.runs_hits += 1
+
+        self.storage.evict()
+        logger.info("BRIL lumis cache stats: %s", self.stats())
+
+        detailed = [lumi for run_number in sorted(lumis_by_run) for lumi in lumis_by_run[run_number]]
+        return {"detailed": detailed}
@@ -0,0 +1,121 @@
+import logging
+import time
+from collections import defaultdict
+
+from libdc3.methods.rr_actions import RunRegistryActions
+
+from .storage import FileCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class RunRegistryLumisCache:
+    """
+    Per-run cache in front of `RunRegistryActions.multi_fetch_rr_oms_joint_lumis`
+
+    Entries are keyed by (class_name, dataset_name, run_number) and stored as joint
+    lumisection ranges, which are expanded back to one dict per lumisection on read.
+
+    Every entry records the state and last modification time of the run's offline dataset,
+    revalidated against RR on each read (one dataset query for all the runs): a dataset
+    reopened or edited since invalidates the entry. Runs whose dataset is COMPLETED are
+    re-fetched once their entry is older than `final_run_max_age` seconds, every other run
+    (OPEN, SIGNOFF or not yet in RR) once it is older than `open_run_max_age` seconds.
+    """
+
+    NAMESPACE = "rr_oms_lumis"
+    FINAL_STATES = ("COMPLETED",)
+
+    def __init__(
+        self,
+        rra: RunRegistryActions,
+        cache_dir: str | None = None,
+        open_run_max_age: int = 60 * 60,
+        final_run_max_age: int = 7 * 24 * 60 * 60,
+    ):
+        self.rra = rra
+        self.open_run_max_age = open_run_max_age
+        self.final_run_max_age = final_run_max_age
+        self.storage = FileCache(cache_dir, self.NAMESPACE) if cache_dir else None
+        self.runs_hits = 0
+        self.runs_misses = 0
+
+    @staticmethod
+    def make_key(class_name: str, dataset_name: str, run_number: int) -> dict:
+        return {"class_name": class_name, "dataset_name": dataset_name, "run_number": run_number}
+
+    def key(self, run_number: int) -> dict:
+        return self.make_key(self.rra.class_name, self.rra.dataset_name, run_number)
+
+    def stats(self) -> dict:
+        return {"hits": self.runs_hits, "misses": self.runs_misses}
+
+    def is_fresh(self, entry: dict, dataset: dict | None) -> bool:
+        if entry.get("dataset") != dataset:
+            return False
+        final = dataset is not None and dataset["state"] in self.FINAL_STATES
+        max_age = self.final_run_max_age if final else self.open_run_max_age
+        return time.time() - entry["created_at"] <= max_age
+
+    def fetch_datasets(self, run_list: list[int]) -> dict[int, dict]:
+        """
+        State and last modification time of the offline dataset of every run of `run_list` in RR
+        """
+        datasets = self.rra.fetch_datasets(min_run=min(run_list), max_run=max(run_list))
+        return {
+            dataset["run_number"]: {
+                "state": dataset.get("dataset_attributes", {}).get("global_state"),
+                "updated_at": dataset.get("updatedAt"),
+            }
+            for dataset in datasets
+        }
+
+    @staticmethod
+    def compress(lumis: list[dict]) -> list[dict]:
+        """
+        Merge consecutive lumisections carrying the same flags into a single range
+        """
+        ranges = []
+        for lumi in lumis:
+            flags = {key: value for key, value in lumi.items() if key not in ("run_number", "ls_number")}
+            if ranges and ranges[-1]["flags"] == flags and ranges[-1]["end"] + 1 == lumi["ls_number"]:
+                ranges[-1]["end"] = lumi["ls_number"]
+            else:
+                ranges.append({"start": lumi["ls_number"], "end": lumi["ls_number"], "flags": flags})
+        return ranges
+
+    @staticmethod
+    def expand(run_number: int, ranges: list[dict]) -> list[dict]:
+        return [
+            {"run_number": run_number, "ls_number": ls_number, **joint_range["flags"]}
+            for joint_range in ranges
+            for ls_number in range(joint_range["start"], joint_range["end"] + 1)
+        ]
+
+    def multi_fetch_rr_oms_joint_lumis(self, run_list: list[int]) -> list[dict]:
+        if self.storage is None or len(run_list) == 0:
+            return self.rra.multi_fetch_rr_oms_joint_lumis(run_list=run_list)
+
+        datasets = self.fetch_datasets(run_list)
+        ranges_by_run = {}
+        for run_number in run_list:
+            entry = self.storage.get(self.key(run_number))
+            if entry is not None and self.is_fresh(entry, datasets.get(run_number)):
+                ranges_by_run[run_number] = entry["payload"]
+
+        missing_runs = [run_number for run_number in run_list if run_number not in ranges_by_run]
+        self.runs_hits += len(run_list) - len(missing_runs)
+        self.runs_misses += len(missing_runs)
+        if len(missing_runs) > 0:
+            # Lumisections are not guaranteed to come grouped by run
+            fetched_lumis = defaultdict(list)
+            for lumi in self.rra.multi_fetch_rr_oms_joint_lumis(run_list=missing_runs):
+                fetched_lumis[lumi["run_number"]].append(lumi)
+            for run_number in missing_runs:
+                ranges = self.compress(fetched_lumis.get(run_number, []))
+                self.storage.set(self.key(run_number), ranges, dataset=datasets.get(run_number))
+                ranges_by_run[run_number] = ranges
+
+        logger.info("RR/OMS lumis cache stats: %s", self.stats())
+        return [lumi for run_number in run_list for lumi in self.expand(run_number, ranges_by_run[run_number])]
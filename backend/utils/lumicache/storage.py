@@ -0,0 +1,135 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+class FileCache:
+    """
+    Content-addressed key/value store backed by gzipped JSON files
+
+    Each entry is addressed by the sha256 digest of its (JSON encoded) key,
+    so any combination of parameters can be used as key without worrying
+    about forbidden characters in file names.
+
+    If `max_size` (in bytes) is given, `evict` removes the least recently
+    used entries until the namespace fits in it. Reads (except peeks) refresh the entry
+    modification time, which is what is used to rank entries.
+    """
+
+    SCHEMA_VERSION = 1
+    EXTENSION = ".json.gz"
+    LOCK_EXTENSION = ".lock"
+
+    def __init__(self, root_dir: str, namespace: str, max_size: int | None = None):
+        self.root_dir = os.path.join(root_dir, namespace)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    @classmethod
+    def digest(cls, key: dict) -> str:
+        encoded = json.dumps({"v": cls.SCHEMA_VERSION, **key}, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def path(self, key: dict) -> str:
+        digest = self.digest(key)
+        return os.path.join(self.root_dir, digest[:2], f"{digest}{self.EXTENSION}")
+
+    def exists(self, key: dict) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def peek(self, key: dict) -> dict | None:
+        """
+        Entry of `key` without refreshing it, for reads (e.g. estimates) that shouldn't keep it from eviction
+        """
+        try:
+            with gzip.open(self.path(key), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, EOFError, OSError, json.JSONDecodeError):
+            return None
+
+    def get(self, key: dict) -> dict | None:
+        entry = self.peek(key)
+        if entry is not None:
+            try:
+                os.utime(self.path(key))
+            except OSError:
+                entry = None  # Evicted meanwhile
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def set(self, key: dict, payload, **metadata) -> dict:
+        entry = {"key": key, "created_at": time.time(), **metadata, "payload": payload}
+        fpath = self.path(key)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+
+        # Write to a temporary file first and then rename it,
+        # so concurrent readers never see a partially written entry
+        fd, tmp_fpath = tempfile.mkstemp(dir=os.path.dirname(fpath), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_fpath, fpath)
+        except BaseException:
+            if os.path.exists(tmp_fpath):
+                os.remove(tmp_fpath)
+            raise
+
+        return entry
+
+    @contextmanager
+    def lock(self, key: dict):
+        """
+        Exclusive lock on the entry of `key` across processes, for read-modify-write updates
+        """
+        fpath = self.path(key) + self.LOCK_EXTENSION
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.__scan())
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the namespace fits in `max_size`
+        """
+        if self.max_size is None:
+            return 0
+
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self.__scan()]
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, fpath in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(fpath)
+            except FileNotFoundError:
+                continue
+            total_size -= size
+            removed += 1
+
+        return removed
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def __scan(self):
+        for bucket in os.scandir(self.root_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.is_file() and entry.name.endswith(self.EXTENSION):
+                    yield entry
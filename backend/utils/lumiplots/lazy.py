@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import tempfile
+
+import matplotlib
+from libdc3.methods.lumiloss_plotter import LumilossPlotter
+
+from ..results.reader import open_result
+
+
+matplotlib.use("Agg")
+
+MANIFEST_FNAME = ".lazy_plots.json"
+RENDER_DIR_PREFIX = ".render-"
+
+# Plot file (relative to the plots directory) -> LumilossPlotter method
+LUMILOSS_PLOTS = {
+    "Subsystem/dqmflags_loss.png": "plot_subsystem_dqmflag_loss",
+    "DCS/dcsflags_loss.png": "plot_dcs_loss",
+    "CMS/inclusive_loss.png": "plot_cms_inclusive_loss",
+    "CMS/exclusive_loss.png": "plot_cms_exclusive_loss",
+    "CMS/detailed_fraction_exclusive_loss.png": "plot_cms_detailed_fraction_exclusive_loss",
+    "CMS/pie_chat_exclusive_loss.png": "plot_fraction_of_exclusive_loss_by_subdetector",
+}
+
+# Plot file (relative to Subdetector/<subdetector>) -> (LumilossPlotter method, LumilossPlotter attribute)
+SUBDETECTOR_PLOTS = {
+    "inclusive_loss.png": ("plot_inclusive_loss_by_subdetector", "detector_inclusive_loss"),
+    "exclusive_loss.png": ("plot_exclusive_loss_by_subdetector", "detector_exclusive_loss"),
+}
+
+# Lumiloss results needed by LumilossPlotter, each one stored in `<data_path>/<key>.json`
+LUMILOSS_KEYS = (
+    "dcs_loss",
+    "subsystems_loss",
+    "cms_inclusive_loss",
+    "cms_exclusive_loss",
+    "cms_frac_exclusive_loss",
+    "cms_detailed_frac_exclusive_loss",
+    "detector_inclusive_loss",
+    "detector_exclusive_loss",
+)
+
+
+def save_lumiloss_manifest(plots_path: str, data_path: str, unit: str, lumiloss: dict):
+    """
+    Register the lumiloss plots of `plots_path` to be rendered on demand from the results stored in `data_path`
+    """
+    plots = {fpath: {"method": method} for fpath, method in LUMILOSS_PLOTS.items()}
+    for fname, (method, attr) in SUBDETECTOR_PLOTS.items():
+        for subdetector in lumiloss[attr]:
+            plots[f"Subdetector/{subdetector}/{fname}"] = {"method": method, "attr": attr, "subdetector": subdetector}
+
+    manifest = {"data_path": os.path.relpath(data_path, plots_path), "unit": unit, "plots": plots}
+    os.makedirs(plots_path, exist_ok=True)
+    with open(os.path.join(plots_path, MANIFEST_FNAME), "w") as f:
+        json.dump(manifest, f)
+
+
+def find_manifest(path: str, base_dir: str) -> tuple[str, dict] | tuple[None, None]:
+    """
+    Look for a lazy plots manifest in `path` or any of its parents up to `base_dir`
+    """
+    base_dir = os.path.abspath(base_dir)
+    current = os.path.abspath(path)
+    while current.startswith(base_dir):
+        fpath = os.path.join(current, MANIFEST_FNAME)
+        if os.path.isfile(fpath):
+            with open(fpath) as f:
+                return current, json.load(f)
+        if current == base_dir:
+            break
+        current = os.path.dirname(current)
+
+    return None, None
+
+
+def list_lazy_entries(dir_path: str, base_dir: str) -> dict[str, bool]:
+    """
+    Not yet rendered entries directly under `dir_path`, mapped to whether they are directories
+    """
+    plots_path, manifest = find_manifest(dir_path, base_dir)
+    if manifest is None:
+        return {}
+
+    prefix = os.path.relpath(os.path.abspath(dir_path), plots_path)
+    prefix = "" if prefix == "." else prefix + "/"
+    result = {}
+    for fpath in manifest["plots"]:
+        if not fpath.startswith(prefix):
+            continue
+        name, *rest = fpath[len(prefix) :].split("/")
+        if not os.path.exists(os.path.join(dir_path, name)):
+            result[name] = len(rest) > 0
+
+    return result
+
+
+def list_lazy_plots(dir_path: str, base_dir: str) -> list[str]:
+    """
+    Not yet rendered plot files anywhere under `dir_path`, registered in the manifest of
+    `dir_path` (or one of its parents) or of any of its subdirectories
+    """
+    dir_path = os.path.abspath(dir_path)
+    plots_path, _ = find_manifest(dir_path, base_dir)
+    plots_paths = {plots_path} if plots_path else set()
+    for root, dirnames, fnames in os.walk(dir_path):
+        dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+        if MANIFEST_FNAME in fnames:
+            plots_paths.add(root)
+
+    result = []
+    for plots_path in sorted(plots_paths):
+        with open(os.path.join(plots_path, MANIFEST_FNAME)) as f:
+            manifest = json.load(f)
+        for fpath in manifest["plots"]:
+            file_path = os.path.join(plots_path, fpath)
+            if file_path.startswith(dir_path + os.sep) and not os.path.exists(file_path):
+                result.append(file_path)
+
+    return result
+
+
+def render_lazy_plot(file_path: str, base_dir: str) -> bool:
+    """
+    Render `file_path` from the stored lumiloss results if it is registered in a lazy plots manifest
+
+    The plot is rendered in a temporary directory and moved in place, so the cached PNG
+    is never seen half-written by concurrent requests.
+    """
+    plots_path, manifest = find_manifest(os.path.dirname(file_path), base_dir)
+    if manifest is None:
+        return False
+
+    plot = manifest["plots"].get(os.path.relpath(os.path.abspath(file_path), plots_path))
+    if plot is None:
+        return False
+
+    data_path = os.path.normpath(os.path.join(plots_path, manifest["data_path"]))
+    lumiloss = {}
+    for key in LUMILOSS_KEYS:
+        with open_result(os.path.join(data_path, f"{key}.json")) as f:
+            lumiloss[key] = json.load(f)
+
+    tmp_dir = tempfile.mkdtemp(dir=plots_path, prefix=RENDER_DIR_PREFIX)
+    try:
+        plotter = LumilossPlotter(lumiloss=lumiloss, unit=manifest["unit"], output_path=tmp_dir)
+        if "subdetector" in plot:
+            # Subdetector methods plot every subdetector, restrict it to the requested one
+            setattr(plotter, plot["attr"], {plot["subdetector"]: getattr(plotter, plot["attr"])[plot["subdetector"]]})
+        getattr(plotter, plot["method"])()
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(os.path.join(tmp_dir, os.path.relpath(os.path.abspath(file_path), plots_path)), file_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return True
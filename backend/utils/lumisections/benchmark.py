@@ -0,0 +1,55 @@
+"""
+Benchmark lumisection filtering with plain lists against RunSelection
+
+Usage (from the backend directory):
+    python -m utils.lumisections.benchmark --runs 2000 --lumis-per-run 500
+"""
+
+import argparse
+import random
+import time
+
+from .run_selection import RunSelection
+
+
+def generate_lumis(n_runs: int, lumis_per_run: int, first_run: int = 378000) -> list[dict]:
+    return [
+        {"run_number": run_number, "ls_number": ls_number}
+        for run_number in range(first_run, first_run + n_runs)
+        for ls_number in range(1, lumis_per_run + 1)
+    ]
+
+
+def timeit(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--lumis-per-run", type=int, default=500)
+    parser.add_argument("--selected-fraction", type=float, default=0.8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lumis = generate_lumis(args.runs, args.lumis_per_run)
+    all_runs = sorted({lumi["run_number"] for lumi in lumis})
+    selected_runs = random.sample(all_runs, int(len(all_runs) * args.selected_fraction))
+    selection = RunSelection(selected_runs)
+
+    list_time = timeit(lambda: [lumi for lumi in lumis if lumi["run_number"] in selected_runs], args.repeat)
+    selection_time = timeit(lambda: selection.filter(lumis), args.repeat)
+
+    print(f"lumisections: {len(lumis)}, runs: {len(all_runs)}, selected runs: {len(selected_runs)}")
+    print(f"list membership:  {list_time:.3f}s")
+    print(f"RunSelection:     {selection_time:.3f}s")
+    print(f"speedup:          {list_time / selection_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+
+import numpy as np
+
+
+class _Missing:
+    """
+    Value of a key absent from the input record, dropped again when records are rebuilt
+    """
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __reduce__(self) -> str:
+        # Unpickled (e.g. in worker processes) as the module singleton
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+# Encoding of flag columns, a key set to None and a missing key are told apart
+FLAG_MISSING = -2
+FLAG_NONE = -1
+FLAG_FALSE = 0
+FLAG_TRUE = 1
+
+
+def _encode_column(values: list) -> np.ndarray:
+    present = [value for value in values if value is not None and value is not MISSING]
+    if all(isinstance(value, bool) for value in present):
+        encoded = [
+            FLAG_MISSING if value is MISSING else FLAG_NONE if value is None else FLAG_TRUE if value else FLAG_FALSE
+            for value in values
+        ]
+        return np.array(encoded, dtype=np.int8)
+    if len(present) == len(values):
+        if all(isinstance(value, int) for value in values):
+            return np.array(values, dtype=np.int64)
+        if all(isinstance(value, (int, float)) for value in values):
+            return np.array(values, dtype=np.float64)
+        if all(isinstance(value, datetime) and value.tzinfo is None for value in values):
+            return np.array(values, dtype="datetime64[us]")
+    return np.array(values, dtype=object)
+
+
+def _decode_column(column: np.ndarray) -> list:
+    if column.dtype == np.int8:
+        decoded = {FLAG_MISSING: MISSING, FLAG_NONE: None, FLAG_FALSE: False, FLAG_TRUE: True}
+        return [decoded[value] for value in column.tolist()]
+    return column.tolist()
+
+
+class LumisectionTable:
+    """
+    Columnar lumisections, one numpy array per key and sorted by run number
+
+    Boolean flags are stored as int8 (1 = True, 0 = False, -1 = None, -2 = missing), numbers
+    as int64/float64 and naive datetimes as datetime64, which takes a fraction of the
+    memory of one dict per lumisection. Run filtering and slicing are vectorized and
+    records are only rebuilt (`to_records`) at the libdc3 analyzers boundary.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray]):
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], keys: Iterable[str] | None = None) -> "LumisectionTable":
+        records = records if isinstance(records, list) else list(records)
+        if keys is None:
+            keys = list(dict.fromkeys(key for record in records for key in record))
+
+        columns = {}
+        for key in keys:
+            columns[key] = _encode_column([record.get(key, MISSING) for record in records])
+        if len(records) == 0:
+            columns["run_number"] = np.array([], dtype=np.int64)
+
+        # Stable sort, so lumisections keep their order inside each run
+        order = np.argsort(columns["run_number"], kind="stable")
+        return cls({key: column[order] for key, column in columns.items()})
+
+    def __len__(self) -> int:
+        return len(self.columns["run_number"])
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.columns[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.columns
+
+    def __repr__(self) -> str:
+        return f"LumisectionTable <{len(self)} lumisections, {len(self.columns)} columns>"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def take(self, selector: np.ndarray | slice) -> "LumisectionTable":
+        return LumisectionTable({key: column[selector] for key, column in self.columns.items()})
+
+    def runs(self) -> np.ndarray:
+        return np.unique(self.columns["run_number"])
+
+    def between(self, min_run: int, max_run: int) -> "LumisectionTable":
+        lo = np.searchsorted(self.columns["run_number"], min_run, side="left")
+        hi = np.searchsorted(self.columns["run_number"], max_run, side="right")
+        return self.take(slice(lo, hi))
+
+    def filter_runs(self, runs: Iterable[int]) -> "LumisectionTable":
+        return self.take(np.isin(self.columns["run_number"], np.fromiter(runs, dtype=np.int64)))
+
+    def exclude_runs(self, runs: Iterable[int]) -> "LumisectionTable":
+        return self.take(~np.isin(self.columns["run_number"], np.fromiter(runs, dtype=np.int64)))
+
+    def flag(self, key: str) -> np.ndarray:
+        """
+        Boolean mask of lumisections where `key` is True (missing columns are never True)
+        """
+        column = self.columns.get(key)
+        if column is None:
+            return np.zeros(len(self), dtype=bool)
+        if column.dtype == np.int8:
+            return column == FLAG_TRUE
+        return np.array([bool(value) for value in column.tolist()], dtype=bool)
+
+    def iter_records(self) -> Iterator[dict]:
+        keys = list(self.columns)
+        decoded = [_decode_column(self.columns[key]) for key in keys]
+        for values in zip(*decoded, strict=True):
+            # Keys absent from the input record are left out, like they were
+            yield {key: value for key, value in zip(keys, values, strict=True) if value is not MISSING}
+
+    def to_records(self) -> list[dict]:
+        return list(self.iter_records())
@@ -0,0 +1,143 @@
+import re
+from itertools import groupby
+
+import numpy as np
+from libdc3.utils import yield_range
+
+from .columnar import LumisectionTable
+
+
+# Profiles every job generates, named after the JSON file they are saved to
+DEFAULT_PROFILES = ("pre", "golden", "muon")
+PROFILE_NAME_REGEX = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Corner case for call_7, OMS beam1_present and beam2_present flags are not correct in these runs
+BEAM_PRESENT_FLAGS = frozenset(("beam1_present", "beam2_present"))
+BEAM_PRESENT_BROKEN_RUNS = (355101, 355208)
+
+
+def json_profiles(params: dict, names: tuple[str, ...] = DEFAULT_PROFILES) -> dict[str, dict]:
+    """
+    Build the profiles of `names` from the job parameters (`<name>_json_oms_flags`, `<name>_json_rr_flags`),
+    plus the user defined `extra_json_profiles` ({name: {"oms_flags": [...], "rr_flags": [...]}})
+    """
+    profiles = {
+        name: {"oms_flags": params[f"{name}_json_oms_flags"], "rr_flags": params.get(f"{name}_json_rr_flags")}
+        for name in names
+    }
+    for name, profile in (params.get("extra_json_profiles") or {}).items():
+        if not PROFILE_NAME_REGEX.match(name) or name in profiles:
+            raise ValueError(f"Invalid JSON profile name: {name}")
+        profiles[name] = {"oms_flags": profile["oms_flags"], "rr_flags": profile.get("rr_flags")}
+
+    return profiles
+
+
+class MultiJsonProducer:
+    """
+    Same selection as libdc3 JsonProducer, but evaluating any number of flag profiles
+    in a single pass over the lumisections
+
+    The flags of each lumisection are evaluated once and every profile is then
+    a subset check, so adding a profile costs almost nothing compared to a new pass.
+    Like JsonProducer, input lists are sorted in place by run number. A LumisectionTable
+    can be given instead, in which case every profile is evaluated with vectorized masks.
+    """
+
+    def __init__(self, rr_oms_lumis: list[dict] | LumisectionTable, ignore_hlt_emergency: bool = False):
+        if isinstance(rr_oms_lumis, list):
+            rr_oms_lumis.sort(key=lambda x: x["run_number"])
+        self.lumis = rr_oms_lumis
+        self.ignore_hlt_emergency = ignore_hlt_emergency
+
+    @staticmethod
+    def is_hlt_on_emergency(lumi_flags: dict) -> bool:
+        return lumi_flags.get("prescale_name") == "Emergency" and lumi_flags.get("prescale_index") == 0
+
+    def compile_profiles(self, profiles: dict[str, dict]) -> list[tuple]:
+        compiled = []
+        for name, profile in profiles.items():
+            oms_flags = frozenset(profile["oms_flags"])
+            rr_flags = frozenset(profile.get("rr_flags") or [])
+            # If rr_flags is not given (a.k.a preview), we can check hlt emergency
+            check_hlt = not rr_flags and self.ignore_hlt_emergency is False
+            compiled.append((name, oms_flags | rr_flags, (oms_flags - BEAM_PRESENT_FLAGS) | rr_flags, check_hlt))
+        return compiled
+
+    def generate(self, profiles: dict[str, dict]) -> dict[str, dict]:
+        """
+        Return one compact JSON ({run_number: lumi_ranges}) per profile
+        """
+        compiled = self.compile_profiles(profiles)
+        checked_flags = frozenset().union(*(required_flags for _, required_flags, _, _ in compiled))
+        if isinstance(self.lumis, LumisectionTable):
+            return self.generate_from_table(compiled, checked_flags)
+
+        result = {name: {} for name in profiles}
+        for run_number, lumis in groupby(self.lumis, key=lambda x: x["run_number"]):
+            is_broken_run = BEAM_PRESENT_BROKEN_RUNS[0] <= run_number <= BEAM_PRESENT_BROKEN_RUNS[1]
+            good_lumis = {name: [] for name in profiles}
+            for lumi_flags in lumis:
+                # Each flag is evaluated once per lumisection, whatever the number of profiles using it
+                flags = {flag for flag in checked_flags if lumi_flags.get(flag)}
+                is_hlt_on_emergency = self.is_hlt_on_emergency(lumi_flags)
+                for name, required_flags, broken_run_required_flags, check_hlt in compiled:
+                    if is_broken_run:
+                        required_flags = broken_run_required_flags
+                    if required_flags <= flags and not (check_hlt and is_hlt_on_emergency):
+                        good_lumis[name].append(lumi_flags["ls_number"])
+
+            for name, lumi_numbers in good_lumis.items():
+                if len(lumi_numbers) > 0:
+                    result[name][run_number] = list(yield_range(lumi_numbers))
+
+        return result
+
+    def generate_from_table(self, compiled: list[tuple], checked_flags: frozenset) -> dict[str, dict]:
+        table = self.lumis
+        runs = table["run_number"]
+        ls_numbers = table["ls_number"]
+        flags = {flag: table.flag(flag) for flag in checked_flags}
+        is_broken_run = (runs >= BEAM_PRESENT_BROKEN_RUNS[0]) & (runs <= BEAM_PRESENT_BROKEN_RUNS[1])
+        prescale_names = table["prescale_name"].tolist() if "prescale_name" in table else [None] * len(table)
+        prescale_indexes = table["prescale_index"].tolist() if "prescale_index" in table else [None] * len(table)
+        is_hlt_on_emergency = np.array(
+            [
+                prescale_name == "Emergency" and prescale_index == 0
+                for prescale_name, prescale_index in zip(prescale_names, prescale_indexes, strict=True)
+            ],
+            dtype=bool,
+        )
+
+        result = {}
+        for name, required_flags, broken_run_required_flags, check_hlt in compiled:
+            good = np.ones(len(table), dtype=bool)
+            for flag in required_flags:
+                good &= flags[flag]
+            if is_broken_run.any():
+                good_in_broken_run = np.ones(len(table), dtype=bool)
+                for flag in broken_run_required_flags:
+                    good_in_broken_run &= flags[flag]
+                good = np.where(is_broken_run, good_in_broken_run, good)
+            if check_hlt:
+                good &= ~is_hlt_on_emergency
+
+            result[name] = {}
+            good_runs = runs[good]
+            good_ls_numbers = ls_numbers[good]
+            if len(good_runs) == 0:
+                continue
+
+            # A lumi range ends at every run change or gap in lumisection numbers
+            breaks = np.flatnonzero((np.diff(good_runs) != 0) | (np.diff(good_ls_numbers) != 1)) + 1
+            starts = np.concatenate(([0], breaks))
+            ends = np.concatenate((breaks - 1, [len(good_runs) - 1]))
+            for run_number, start, end in zip(
+                good_runs[starts].tolist(),
+                good_ls_numbers[starts].tolist(),
+                good_ls_numbers[ends].tolist(),
+                strict=True,
+            ):
+                result[name].setdefault(run_number, []).append([start, end])
+
+        return result
@@ -0,0 +1,43 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+
+
+class RunIndex:
+    """
+    Records sorted once by run number and sliced by run interval with bisect
+
+    Slicing only copies references to the records, never the records themselves,
+    and costs O(log n + k) instead of a full scan for every interval.
+    Records can be dicts (indexed by `key`) or plain run numbers (`key=None`).
+    """
+
+    def __init__(self, records: Iterable, key: str | None = "run_number"):
+        if key is None:
+            self.records = sorted(records)
+            self.runs = self.records
+        else:
+            self.records = sorted(records, key=lambda x: x[key])
+            self.runs = [record[key] for record in self.records]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def between(self, min_run: int, max_run: int) -> list:
+        lo = bisect_left(self.runs, min_run)
+        hi = bisect_right(self.runs, max_run)
+        return self.records[lo:hi]
+
+
+class JsonIndex:
+    """
+    Same as RunIndex, but for compact JSONs ({run_number: lumi_ranges})
+    """
+
+    def __init__(self, compact_json: dict):
+        self.json = compact_json
+        self.runs = sorted(compact_json)
+
+    def between(self, min_run: int, max_run: int) -> dict:
+        lo = bisect_left(self.runs, min_run)
+        hi = bisect_right(self.runs, max_run)
+        return {run: self.json[run] for run in self.runs[lo:hi]}
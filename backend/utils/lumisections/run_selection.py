@@ -0,0 +1,47 @@
+from collections.abc import Iterable, Iterator
+
+
+class RunSelection:
+    """
+    Immutable set of run numbers used to select run-indexed records
+
+    Membership checks are O(1), so filtering n records against m runs
+    is O(n + m) instead of the O(n * m) of checking against a list.
+    """
+
+    def __init__(self, *run_lists: Iterable[int]):
+        self.runs = frozenset(run for run_list in run_lists for run in run_list)
+
+    def __contains__(self, run_number: int) -> bool:
+        return run_number in self.runs
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(sorted(self.runs))
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def __or__(self, other: Iterable[int]) -> "RunSelection":
+        return RunSelection(self.runs, other)
+
+    def __sub__(self, other: Iterable[int]) -> "RunSelection":
+        other = other.runs if isinstance(other, RunSelection) else frozenset(other)
+        return RunSelection(self.runs - other)
+
+    def __repr__(self) -> str:
+        return f"RunSelection <{len(self.runs)} runs>"
+
+    def between(self, min_run: int, max_run: int) -> "RunSelection":
+        return RunSelection(run for run in self.runs if min_run <= run <= max_run)
+
+    def filter_runs(self, runs: Iterable[int]) -> list[int]:
+        return [run for run in runs if run in self.runs]
+
+    def exclude_runs(self, runs: Iterable[int]) -> list[int]:
+        return [run for run in runs if run not in self.runs]
+
+    def filter(self, records: Iterable[dict], key: str = "run_number") -> list[dict]:
+        return [record for record in records if record[key] in self.runs]
+
+    def exclude(self, records: Iterable[dict], key: str = "run_number") -> list[dict]:
+        return [record for record in records if record[key] not in self.runs]
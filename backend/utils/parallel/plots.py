@@ -0,0 +1,67 @@
+import pickle
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from .pool import resolve_workers, run_in_pool
+
+
+matplotlib.use("Agg")
+
+# Rough peak memory (in bytes) of matplotlib rendering a plot, on top of the plotter data
+PLOT_RENDER_MEMORY = 256 * 1024**2
+# Unpickled plotters (dicts, lists and arrays of lumisections) take a few times their pickled size
+UNPICKLED_SIZE_FACTOR = 3
+
+
+def render_plots(plotter: object, methods: list[str]):
+    for method in methods:
+        getattr(plotter, method)()
+        plt.close("all")
+
+
+def render_pickled_plots(payload: bytes, methods: list[str]):
+    render_plots(pickle.loads(payload), methods)  # noqa: S301
+
+
+class PlotStage:
+    """
+    Collect independent plot calls and render all of them at once
+
+    Matplotlib rendering is single-threaded and CPU bound, so plotters are dispatched
+    to a pool of worker processes (Agg backend) when more than one worker is available.
+    Each plotter is pickled once and its plot methods are rendered one after the other
+    in the same worker, plot methods must only write files. The number of workers is
+    bounded by the memory needed to hold the largest plotter.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers
+        self.calls = []
+
+    def __len__(self) -> int:
+        return sum(len(call["methods"]) for call in self.calls)
+
+    def add(self, plotter: object, *methods: str):
+        for call in self.calls:
+            if call["plotter"] is plotter:
+                call["methods"].extend(methods)
+                return
+        self.calls.append({"plotter": plotter, "methods": list(methods)})
+
+    def render(self):
+        calls, self.calls = self.calls, []
+        if len(calls) > 1 and resolve_workers(self.workers, memory_per_worker=PLOT_RENDER_MEMORY) > 1:
+            tasks = [
+                {"payload": pickle.dumps(call["plotter"], protocol=pickle.HIGHEST_PROTOCOL), "methods": call["methods"]}
+                for call in calls
+            ]
+            payload_size = max(len(task["payload"]) for task in tasks)
+            memory_per_worker = PLOT_RENDER_MEMORY + UNPICKLED_SIZE_FACTOR * payload_size
+            workers = resolve_workers(self.workers, memory_per_worker=memory_per_worker)
+            if workers > 1:
+                run_in_pool(render_pickled_plots, tasks, workers)
+                return
+
+        for call in calls:
+            render_plots(**call)
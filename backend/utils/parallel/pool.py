@@ -0,0 +1,80 @@
+import logging
+import os
+from collections.abc import Callable
+
+import billiard
+
+
+logger = logging.getLogger(__name__)
+
+# cgroup v2 and v1 memory limit files, a very large value means "no limit"
+CGROUP_MEMORY_FILES = (
+    ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+    ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+)
+
+
+def _read_int(fpath: str) -> int | None:
+    try:
+        with open(fpath) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def available_memory() -> int | None:
+    """
+    Memory (in bytes) still available to this process, taking
+    container/HTCondor cgroup limits into account
+    """
+    candidates = []
+    for limit_fpath, usage_fpath in CGROUP_MEMORY_FILES:
+        limit = _read_int(limit_fpath)
+        usage = _read_int(usage_fpath)
+        if limit is not None and usage is not None and limit < 2**60:
+            candidates.append(limit - usage)
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    candidates.append(int(line.split()[1]) * 1024)
+    except OSError:
+        pass
+
+    return min(candidates) if candidates else None
+
+
+def resolve_workers(requested: int | None, memory_per_worker: int) -> int:
+    """
+    Number of worker processes to use: at most `requested`, the number of
+    CPUs available and how many workers fit in the available memory
+    """
+    if not requested or requested <= 1:
+        return 1
+
+    workers = min(requested, len(os.sched_getaffinity(0)))
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, memory // memory_per_worker)
+
+    return max(1, workers)
+
+
+def run_in_pool(func: Callable, tasks: list[dict], workers: int) -> list:
+    """
+    Call `func(**task)` for every task and return the results in the same order
+
+    With one worker (or one task) everything runs in the current process.
+    Otherwise tasks are dispatched to a billiard pool, which (unlike the stdlib
+    multiprocessing) can be created from inside daemonic Celery worker processes.
+    `func` must be defined at module level so it can be pickled.
+    """
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        return [func(**task) for task in tasks]
+
+    logger.info("Running %s tasks of %s in %s processes", len(tasks), func.__name__, workers)
+    with billiard.Pool(processes=workers, maxtasksperchild=1) as pool:
+        results = [pool.apply_async(func, kwds=task) for task in tasks]
+        return [result.get() for result in results]
@@ -0,0 +1,18 @@
+import gzip
+import os
+from typing import TextIO
+
+from .writer import GZIP_EXTENSION
+
+
+def result_exists(fpath: str) -> bool:
+    return os.path.isfile(fpath) or os.path.isfile(fpath + GZIP_EXTENSION)
+
+
+def open_result(fpath: str) -> TextIO:
+    """
+    Open a text result for reading, from its .gz when only the compressed copy is stored
+    """
+    if not os.path.isfile(fpath) and os.path.isfile(fpath + GZIP_EXTENSION):
+        return gzip.open(fpath + GZIP_EXTENSION, "rt", encoding="utf-8")
+    return open(fpath, encoding="utf-8")
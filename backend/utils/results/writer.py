@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import tempfile
+from collections.abc import Iterable
+from contextlib import ExitStack, contextmanager
+
+
+GZIP_EXTENSION = ".gz"
+
+# How text results are stored: plain file, plain file plus a .gz sibling, or only the .gz
+STORE_PLAIN = "plain"
+STORE_PLAIN_AND_GZIP = "plain+gzip"
+STORE_GZIP = "gzip"
+STORAGES = (STORE_PLAIN, STORE_PLAIN_AND_GZIP, STORE_GZIP)
+
+
+class _Tee:
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, chunk: str):
+        for f in self.files:
+            f.write(chunk)
+
+
+def _mkstemp(fpath: str) -> str:
+    fd, tmp_fpath = tempfile.mkstemp(dir=os.path.dirname(fpath) or ".", prefix=f".{os.path.basename(fpath)}.")
+    os.close(fd)
+    return tmp_fpath
+
+
+@contextmanager
+def atomic_writer(fpath: str, storage: str = STORE_PLAIN):
+    """
+    Open `fpath` (and/or `fpath.gz`, depending on `storage`) for text writing through temporary files
+
+    Files are renamed in place only once everything was written, so readers never see a
+    partial result and a failed job leaves any previous result untouched. A copy left by
+    a previous run with another storage is removed, so there is a single version of a result.
+    """
+    if storage not in STORAGES:
+        raise ValueError(f"Invalid results storage: {storage}")
+
+    os.makedirs(os.path.dirname(fpath) or ".", exist_ok=True)
+    targets = []
+    if storage != STORE_GZIP:
+        targets.append(fpath)
+    if storage != STORE_PLAIN:
+        targets.append(fpath + GZIP_EXTENSION)
+    tmp_fpaths = [_mkstemp(target) for target in targets]
+    try:
+        with ExitStack() as stack:
+            files = [
+                stack.enter_context(
+                    gzip.open(tmp_fpath, "wt", encoding="utf-8")
+                    if target.endswith(GZIP_EXTENSION)
+                    else open(tmp_fpath, "w", encoding="utf-8")
+                )
+                for tmp_fpath, target in zip(tmp_fpaths, targets, strict=True)
+            ]
+            yield _Tee(*files)
+        for tmp_fpath, target in zip(tmp_fpaths, targets, strict=True):
+            os.chmod(tmp_fpath, 0o644)
+            os.replace(tmp_fpath, target)
+        for stale_fpath in {fpath, fpath + GZIP_EXTENSION} - set(targets):
+            if os.path.exists(stale_fpath):
+                os.remove(stale_fpath)
+    finally:
+        for tmp_fpath in tmp_fpaths:
+            if os.path.exists(tmp_fpath):
+                os.remove(tmp_fpath)
+
+
+def iter_cms_json(compact_json: dict) -> Iterable[str]:
+    """
+    Encode a compact JSON ({run_number: lumi_ranges}) in the standard CMS layout, one run per line
+    """
+    runs = sorted(compact_json, key=int)
+    yield "{"
+    for idx, run in enumerate(runs):
+        ranges = ", ".join(f"[{start}, {end}]" for start, end in compact_json[run])
+        yield f'{"," if idx > 0 else ""}\n"{run}": [{ranges}]'
+    yield "\n}\n" if runs else "}\n"
+
+
+def write_cms_json(fpath: str, compact_json: dict, storage: str = STORE_PLAIN):
+    with atomic_writer(fpath, storage) as f:
+        for chunk in iter_cms_json(compact_json):
+            f.write(chunk)
+
+
+def write_json(fpath: str, data, storage: str = STORE_PLAIN):
+    with atomic_writer(fpath, storage) as f:
+        for chunk in json.JSONEncoder(separators=(",", ":")).iterencode(data):
+            f.write(chunk)
+
+
+def write_text(fpath: str, text: str, storage: str = STORE_PLAIN):
+    with atomic_writer(fpath, storage) as f:
+        f.write(text)